@@ -0,0 +1,468 @@
+# region Copyright
+
+'''Mad Prompt Generator - benchmark'''
+#========================#
+
+""" Measures the speed of each stage of prompt_generator.py on synthetic dictionaries with the
+same shape as template.json: loading, phrase generation, compact (index) prompts, the NumPy
+batch engine at block sizes from 1k to 1M prompts (when NumPy is installed), grammar rules
+and writing (plain, gzip and xz).
+Results are saved to a JSON file, so two commits can be compared with --compare.
+--serve load-tests the serve mode instead: concurrent requests from a stand-in client against a
+server subprocess, compared with starting the script once per batch.
+--weights checks weighted categories instead: a chi-square test that the observed word
+frequencies match the weights, and the cost of one draw as the category grows. """
+
+""" ## Usage
+
+python benchmark.py                                   (default sizes, results in bench_results.json)
+python benchmark.py --sizes 100,10000 --placeholders 5,50 --prompts 5000 -o before.json
+python benchmark.py --sizes 1000 --placeholders 20 --prompts 1000000        (numpy up to 1M blocks)
+python benchmark.py --compare before.json after.json
+python benchmark.py --serve --clients 8 --requests 20 --prompts 1000 -o serve.json
+python benchmark.py --weights --sizes 10,1000,1000000 --prompts 1000000 -o weights.json """
+
+
+# Copyright (C) <2025>  Sara Donzellini
+# email: sara.donzie@gmail.com
+# github: https://github.com/saradonzellini
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+# region Benchmark
+
+import argparse
+import asyncio
+import contextlib
+import gc
+import io
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import prompt_generator as pg
+
+
+# --- Dizionari sintetici ---
+
+CATEGORIES = [
+    "Subjects_singular", "Subjects_plural", "Concepts_singular", "Concepts_plural",
+    "Verbs_singular", "Verbs_plural", "Adjectives", "Adverbs",
+]
+
+# Blocchi di frase come quelli di template.json, ripetuti fino al numero di placeholder voluto
+_CLAUSES = [
+    "a {Adjectives} {Subjects_singular} {Verbs_singular} {Adverbs}",
+    "the {Adjectives} {Concepts_plural} {Verbs_plural} {Adverbs}",
+    "{Subjects_plural} {Verbs_plural} with {Adjectives} {Concepts_singular}",
+]
+
+
+def synthetic_words(category: str, n: int) -> list[str]:
+    """n distinct words for a category; about a fifth start with a vowel, like real adjectives."""
+    words = []
+    for i in range(n):
+        head = "a" if i % 5 == 0 else "b"
+        if category.startswith("Verbs"):
+            words.append(("is " if category.endswith("singular") else "are ") + f"{head}verb{i}ing")
+        else:
+            words.append(f"{head}{category[:3].lower()}{i}")
+    return words
+
+
+def synthetic_pattern(placeholders: int, seed: int = 0) -> str:
+    """A pattern with exactly the given number of {Category} placeholders."""
+    rng = random.Random(seed)
+    clauses, count = [], 0
+    while count < placeholders:
+        clause = rng.choice(_CLAUSES)
+        clauses.append(clause)
+        count += clause.count("{")
+    text = ", while ".join(clauses)
+    # Toglie i placeholder in eccesso dall'ultima frase
+    while text.count("{") > placeholders:
+        start = text.rindex("{")
+        text = text[:start].rstrip() + text[text.index("}", start) + 1:]
+    return text[0].upper() + text[1:] + "."
+
+
+def synthetic_dictionary(words_per_category: int, placeholders: int) -> dict:
+    """JSON structure in the template.json shape."""
+    return {
+        "prompt_dictionary": {
+            "id": "benchmark",
+            "Patterns_short": [synthetic_pattern(placeholders, seed) for seed in range(4)],
+            "Patterns_long": [synthetic_pattern(placeholders * 2, seed) for seed in range(4)],
+            "Dictionary": {c: synthetic_words(c, words_per_category) for c in CATEGORIES},
+        }
+    }
+
+
+# Blocchi del motore NumPy misurati (quelli fino a --prompts)
+NUMPY_BATCH_SIZES = (1000, 10000, 100000, 1000000)
+
+# --- Misure ---
+
+def process_peak_rss_mb():
+    """
+    High-water mark of the resident memory of the whole process so far, or None where resource
+    is not available. Cumulative: after the largest stage, every later stage reports that peak.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux riporta KB, macOS byte
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def measure(fn, prompts: int) -> dict:
+    """
+    Runs fn twice: once timed, once under tracemalloc for the memory figures.
+    fn must return what it produced, so the objects it keeps alive are counted as well.
+    peak_traced: the largest amount of memory traced at once during fn (not the sum of all its
+    allocations); retained_blocks: memory blocks still allocated when fn returns.
+    """
+    gc.collect()
+    start = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - start
+    del result
+
+    gc.collect()
+    blocks_before = sys.getallocatedblocks()
+    tracemalloc.start()
+    result = fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks = sys.getallocatedblocks() - blocks_before
+    del result
+
+    return {
+        "seconds": round(seconds, 6),
+        "prompts": prompts,
+        "prompts_per_sec": round(prompts / seconds, 1) if seconds else None,
+        "peak_traced_kb": round(peak / 1024, 1),
+        "peak_traced_bytes_per_prompt": round(peak / prompts, 1) if prompts else None,
+        "retained_blocks_per_prompt": round(blocks / prompts, 2) if prompts else None,
+        "process_peak_rss_mb_cumulative": process_peak_rss_mb(),
+    }
+
+
+def bench_case(words: int, placeholders: int, prompts: int, workdir: str) -> list[dict]:
+    """All stages for one dictionary size and pattern length."""
+    path = os.path.join(workdir, f"dict_{words}_{placeholders}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(synthetic_dictionary(words, placeholders), f)
+    size_mb = os.path.getsize(path) / (1024 * 1024)
+    case = {"words_per_category": words, "placeholders": placeholders}
+    results = []
+
+    def add(stage, row, **extra):
+        row.update(case, stage=stage, **extra)
+        results.append(row)
+        print(f"  {stage:<16} {row['seconds']:>9.4f} s  {row['prompts_per_sec'] or 0:>12.0f}/s  "
+              f"{row['peak_traced_bytes_per_prompt'] or 0:>9.0f} peak B/prompt")
+
+    row = measure(lambda: pg.load_json_with_encoding(path), 1)
+    add("load_json", row, file_mb=round(size_mb, 2), mb_per_sec=round(size_mb / row["seconds"], 1))
+    row = measure(lambda: pg.load_parts(path, pg.DICTIONARY_PATH), 1)
+    add("load_parts", row, file_mb=round(size_mb, 2), mb_per_sec=round(size_mb / row["seconds"], 1))
+
+    parts = pg.load_parts(path, pg.DICTIONARY_PATH)
+    pattern = synthetic_pattern(placeholders)
+    random.seed(0)
+    add("phrase", measure(lambda: [pg.generate_grammatical_phrase(parts, pattern) for _ in range(prompts)], prompts))
+
+    compiled = pg.compile_patterns([pattern], parts, pg.analyse_parts(parts))[0]
+    add("render_compiled", measure(lambda: [compiled.render() for _ in range(prompts)], prompts))
+    # Stesso pattern con --engine numpy, un blocco di batch prompt alla volta
+    if pg._import_numpy() is not None:
+        for batch in NUMPY_BATCH_SIZES:
+            if batch > prompts and batch != NUMPY_BATCH_SIZES[0]:
+                break
+            plan = [([compiled], prompts)]
+            add(f"numpy_{batch}", measure(lambda: list(pg.iter_batch_blocks(plan, pg.batch_rng(0), batch)), prompts),
+                batch_size=batch)
+    # Stessi prompt tenuti come righe di indici: confronta i peak B/prompt con render_compiled
+    add("compact", measure(lambda: pg.CompactPrompts.from_plan([([compiled], prompts)]), prompts))
+
+    rendered = [compiled.render() for _ in range(prompts)]
+    add("grammar", measure(lambda: [pg.apply_grammar_rules(p) for p in rendered], prompts))
+
+    out = os.path.join(workdir, "bench_output.txt")
+    with contextlib.redirect_stdout(io.StringIO()):
+        row = measure(lambda: pg.write_prompts(rendered, out), prompts)
+    out_mb = os.path.getsize(out) / (1024 * 1024)
+    add("write", row, mb_per_sec=round(out_mb / row["seconds"], 1))
+    for compression in ("gzip", "xz"):
+        packed = pg.output_filename(out, compression)
+        with contextlib.redirect_stdout(io.StringIO()):
+            row = measure(lambda: pg.write_prompts(rendered, packed, compression=compression), prompts)
+        add(f"write_{compression}", row, mb_per_sec=round(out_mb / row["seconds"], 1),
+            ratio=round(out_mb * 1024 * 1024 / os.path.getsize(packed), 2))
+    os.remove(path)
+    return results
+
+
+# --- Load test del server ---
+
+# Il launcher, come lo avvia chi lo usa (pg è il modulo del programma, mad_prompt_generator.py)
+PG_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(pg.__file__)), "prompt_generator.py")
+
+async def fetch(host: str, port: int, query: str) -> dict:
+    """Stand-in client: one GET /generate, chunked body decoded, with its timings."""
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f"GET /generate?{query} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode("latin-1"))
+    await writer.drain()
+    lines = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+    headers = dict(line.split(": ", 1) for line in lines[1:] if line)
+    body, first = bytearray(), None
+    if headers.get("Transfer-Encoding") == "chunked":
+        while True:
+            size = int((await reader.readline()).strip(), 16)
+            if not size:
+                break
+            body += await reader.readexactly(size)
+            await reader.readexactly(2)
+            if first is None:
+                first = time.perf_counter() - start
+    else:
+        body += await reader.read()
+    writer.close()
+    await writer.wait_closed()
+    return {"status": int(lines[0].split()[1]), "headers": headers, "body": bytes(body),
+            "first_block": first, "seconds": time.perf_counter() - start}
+
+async def _load(port: int, path: str, clients: int, requests: int, prompts: int) -> tuple:
+    """clients concurrent clients, each sending requests requests one after the other."""
+    from urllib.parse import quote
+
+    async def client(c):
+        return [await fetch("127.0.0.1", port, f"input={quote(path)}&n={prompts}&seed={c * requests + r}")
+                for r in range(requests)]
+
+    start = time.perf_counter()
+    replies = [r for rs in await asyncio.gather(*(client(c) for c in range(clients))) for r in rs]
+    return replies, time.perf_counter() - start
+
+def _percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+def serve_load_test(clients: int, requests: int, prompts: int, words: int, placeholders: int) -> dict:
+    """
+    Starts `prompt_generator.py serve` on a free port with a synthetic dictionary preloaded and
+    runs the load. Checks the body for seed 0 against the file the command line writes with
+    --seed 0, and times the command line once per batch as the baseline the server replaces.
+    """
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, f"dict_{words}_{placeholders}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(synthetic_dictionary(words, placeholders), f)
+        server = subprocess.Popen(
+            [sys.executable, PG_SCRIPT, "serve", "--port", "0", "--preload", path, "--max-concurrent", str(clients)],
+            stdout=subprocess.PIPE, text=True, encoding="utf-8")
+        try:
+            port = None
+            for line in server.stdout:
+                if "Serving prompts on http://" in line:
+                    port = int(line.split("http://", 1)[1].split()[0].rsplit(":", 1)[1])
+                    break
+            if port is None:
+                raise RuntimeError("the server did not start")
+            replies, wall = asyncio.run(_load(port, path, clients, requests, prompts))
+        finally:
+            server.terminate()
+            server.wait()
+
+        out = os.path.join(workdir, "cli.txt")
+        subprocess.run([sys.executable, PG_SCRIPT, "-i", path, "-n", str(prompts), "--seed", "0", "-o", out],
+                       check=True, stdout=subprocess.DEVNULL)
+        with open(out, "rb") as f:
+            identical = f.read() == replies[0]["body"]
+        batches = min(requests, 3)
+        start = time.perf_counter()
+        for seed in range(batches):
+            subprocess.run([sys.executable, PG_SCRIPT, "-i", path, "-n", str(prompts), "--seed", str(seed), "-o", out],
+                           check=True, stdout=subprocess.DEVNULL)
+        per_batch = (time.perf_counter() - start) / batches
+
+    ok = [r for r in replies if r["status"] == 200]
+    latency = [r["seconds"] for r in ok]
+    total = len(ok) * prompts
+    row = {
+        "stage": "serve", "words_per_category": words, "placeholders": placeholders,
+        "clients": clients, "requests": len(replies), "errors": len(replies) - len(ok),
+        "seconds": round(wall, 6), "prompts": total,
+        "prompts_per_sec": round(total / wall, 1), "requests_per_sec": round(len(ok) / wall, 1),
+        "latency_p50_ms": round(_percentile(latency, 0.5) * 1000, 2),
+        "latency_p95_ms": round(_percentile(latency, 0.95) * 1000, 2),
+        "first_block_p50_ms": round(_percentile([r["first_block"] or 0 for r in ok], 0.5) * 1000, 2),
+        "subprocess_per_batch_ms": round(per_batch * 1000, 2),
+        "identical_to_cli": identical,
+    }
+    print(f"  {len(ok)}/{len(replies)} requests from {clients} clients in {wall:.2f} s: "
+          f"{row['requests_per_sec']:.0f} req/s, {row['prompts_per_sec']:.0f} prompts/s")
+    print(f"  latency p50 {row['latency_p50_ms']} ms, p95 {row['latency_p95_ms']} ms, "
+          f"first block p50 {row['first_block_p50_ms']} ms")
+    print(f"  one subprocess per batch: {row['subprocess_per_batch_ms']} ms per batch")
+    print(f"  body identical to the command line output: {identical}")
+    return row
+
+def _chi_square_p(chi2: float, df: int) -> float:
+    """Upper tail of the chi-square distribution, Wilson-Hilferty normal approximation."""
+    z = ((chi2 / df) ** (1 / 3) - (1 - 2 / (9 * df))) / math.sqrt(2 / (9 * df))
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+def weights_check(words: int, draws: int, skew: float = 1.1, seed: int = 0) -> dict:
+    """
+    Draws from a category of `words` words with Zipf-like weights (1 / rank^skew, so a few words
+    take most of the mass) and compares the observed frequencies with the weights: words are
+    merged into bins with at least 20 expected draws each, then a chi-square test over the bins.
+    Also times the alias table build and the draws; the cost per draw should not grow with words.
+    """
+    weights = [1 / (i + 1) ** skew for i in range(words)]
+    start = time.perf_counter()
+    table = pg.WeightedWords(synthetic_words("W", words), weights)
+    build = time.perf_counter() - start
+
+    rng = random.Random(seed)
+    draw = table.draw_index
+    counts = [0] * words
+    start = time.perf_counter()
+    for _ in range(draws):
+        counts[draw(rng)] += 1
+    seconds = time.perf_counter() - start
+
+    total = sum(weights)
+    bins, expected, observed = [], 0.0, 0
+    for w, c in zip(weights, counts):
+        expected += w / total * draws
+        observed += c
+        if expected >= 20:
+            bins.append((expected, observed))
+            expected, observed = 0.0, 0
+    if bins and expected:
+        e, o = bins.pop()
+        bins.append((e + expected, o + observed))
+    chi2 = sum((o - e) ** 2 / e for e, o in bins)
+    df = max(len(bins) - 1, 1)
+    p = _chi_square_p(chi2, df)
+    row = {
+        "stage": "weighted_draw", "words_per_category": words, "placeholders": 1,
+        "seconds": round(seconds, 6), "prompts": draws,
+        "draws_per_sec": round(draws / seconds, 1), "build_seconds": round(build, 6),
+        "chi2": round(chi2, 2), "df": df, "p_value": round(p, 4), "frequencies_match": p > 0.001,
+    }
+    print(f"  {draws} draws in {seconds:.3f} s ({row['draws_per_sec']:.0f}/s), alias tables built in {build:.3f} s")
+    print(f"  chi-square {row['chi2']} on {df} df, p = {row['p_value']}: "
+          f"{'frequencies match the weights' if row['frequencies_match'] else 'MISMATCH'}")
+    return row
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(sizes: list[int], placeholders: list[int], prompts: int, serve: dict = None, weights: bool = False) -> dict:
+    """
+    serve: {"clients": ..., "requests": ...} to load-test the server instead of the stages;
+    weights: check weighted draws (prompts draws per size) instead of the stages.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for words in sizes:
+            if weights:
+                print(f"⚖️ {words} weighted words")
+                results.append(weights_check(words, prompts))
+                continue
+            for count in placeholders:
+                print(f"📏 {words} words/category, {count} placeholders")
+                if serve:
+                    results.append(serve_load_test(serve["clients"], serve["requests"], prompts, words, count))
+                else:
+                    results.extend(bench_case(words, count, prompts, workdir))
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "prompts": prompts,
+        },
+        "results": results,
+    }
+
+
+def compare(old_file: str, new_file: str):
+    """Prints new/old speed ratios for every stage present in both files."""
+    with open(old_file, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_file, encoding="utf-8") as f:
+        new = json.load(f)
+    key = lambda r: (r["words_per_category"], r["placeholders"], r["stage"])
+    old_rows = {key(r): r for r in old["results"]}
+    print(f"{old['meta'].get('commit')} -> {new['meta'].get('commit')}")
+    for r in new["results"]:
+        o = old_rows.get(key(r))
+        if o is None or not r["seconds"]:
+            continue
+        print(f"  {r['words_per_category']:>8} words  {r['placeholders']:>3} ph  {r['stage']:<16} "
+              f"{o['seconds']:>9.4f} s -> {r['seconds']:>9.4f} s  x{o['seconds'] / r['seconds']:.2f}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark degli stadi di prompt_generator su dizionari sintetici.")
+    parser.add_argument("--sizes", default="100,1000,10000,100000,1000000", help="Parole per categoria, separate da virgole")
+    parser.add_argument("--placeholders", default="5,20,50", help="Placeholder per pattern, separati da virgole")
+    parser.add_argument("--prompts", type=int, default=20000, help="Prompt per stadio")
+    parser.add_argument("-o", "--output", default="bench_results.json", help="File JSON dei risultati")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Confronta due file di risultati ed esce")
+    parser.add_argument("--serve", action="store_true", help="Load test della modalità serve invece degli stadi")
+    parser.add_argument("--clients", type=int, default=8, help="--serve: client concorrenti")
+    parser.add_argument("--requests", type=int, default=20, help="--serve: richieste per client (prompt per richiesta: --prompts)")
+    parser.add_argument("--weights", action="store_true", help="Test statistico e velocità delle estrazioni pesate (estrazioni: --prompts)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.compare:
+        compare(*args.compare)
+        return
+    serve = {"clients": args.clients, "requests": args.requests} if args.serve else None
+    data = run([int(x) for x in args.sizes.split(",")], [int(x) for x in args.placeholders.split(",")],
+               args.prompts, serve, args.weights)
+    output = args.output
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    print(f"✅ Results saved in {output}")
+
+
+if __name__ == "__main__":
+    main()
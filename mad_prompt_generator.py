@@ -0,0 +1,3332 @@
+﻿# region Copyright
+
+'''Mad Prompt Generator'''
+#========================#
+
+""" This is a simple Python script that generates a number of random prompts. The script prompts the user for different style of combinations (random, combinatorial or both), the length desired and then generates a number of prompts decided before in a .txt file. If the user decides to create more prompts, the script will create another file .txt, numbering them in order. """
+
+""" ## Features
+
+- Generates random prompts based on a given dictionary.
+- Supports combinatorial generation of prompts.
+- Outputs prompts to a .txt file.
+- Allows for multiple runs, numbering output files sequentially. """
+
+""" ## Installation
+
+To use this script, you need to have Python 
+It needs a .json "dictionary", three files (themes) are provided. If the user wants can import a customized one. """
+
+""" ## Requirements
+
+- Python 3.x """
+
+""" ## Usage
+
+1. Clone the repository or download the script. """
+
+
+# Copyright (C) <2025>  Sara Donzellini
+# email: sara.donzie@gmail.com
+# github: https://github.com/saradonzellini
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+
+
+
+# region Program
+# version 0.1.0
+
+import os
+import random
+import array
+import itertools
+import bisect
+import collections
+import contextlib
+import time
+import sys
+from collections.abc import AsyncIterator, Iterable, Iterator
+import re
+# json e multiprocessing sono importati dove servono: l'avvio non li paga quando il
+# dizionario arriva dalla cache binaria o non ci sono worker. argparse lo importa
+# parse_args, quindi ogni avvio da riga di comando lo paga; lo evita solo chi usa il modulo
+# da Python (run_args, agenerate)
+# re e itertools invece restano qui: argparse importa comunque re e itertools è builtin,
+# rimandarli non cambia l'avvio da riga di comando (misurato, vedi README)
+
+
+# --- Utility ---
+def chdir_to_program():
+    """Works next to the script (or the frozen executable), like the interactive menu expects."""
+    if getattr(sys, 'frozen', False):
+        os.chdir(os.path.dirname(sys.executable))
+    else:
+        os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_json_with_encoding(filename, tried: list = None):
+    """tried, if given, receives every encoding attempted (for --stats)."""
+    # utf-8-sig reads plain UTF-8 too, and also accepts files saved with a BOM
+    import json
+    encodings_to_try = ["utf-8-sig", "utf-16", "latin-1", "cp1252"]
+    if tried is None:
+        tried = []
+    # Read the bytes once; the encoding probe only decodes them again
+    try:
+        with open(filename, "rb") as f:
+            raw = f.read()
+    except Exception as e:
+        print(f"ERRORE: {e}")
+        return None
+    for enc in encodings_to_try:
+        tried.append(enc)
+        try:
+            return json.loads(raw.decode(enc))
+        except UnicodeDecodeError:
+            continue
+        except Exception as e:
+            print(f"ERRORE: {e}")
+            return None
+    user_enc = input("Impossibile leggere il file JSON. Specifica la codifica: ").strip()
+    tried.append(user_enc)
+    try:
+        return json.loads(raw.decode(user_enc))
+    except Exception as e:
+        print(f"ERRORE: {e}")
+        return None
+
+def flatten_dict(d):
+    """Flattens one level of subcategories: {"A": {"x": [...]}} -> A (merged), A_x."""
+    flat = {}
+    for k, v in d.items():
+        if isinstance(v, list) and v:
+            flat[k] = v
+        elif isinstance(v, dict):
+            # Merge all sublists into a single list under the main key
+            merged = []
+            for subv in v.values():
+                if isinstance(subv, list):
+                    merged.extend(subv)
+            if merged:
+                flat[k] = merged
+            # Also keep secondary keys as before (optional)
+            for subk, subv in v.items():
+                if isinstance(subv, list) and subv:
+                    flat[f"{k}_{subk}"] = subv
+    return flat
+
+class WeightedWords(list):
+    """
+    A category whose words have weights: {"word": "dragon", "w": 5} in the JSON, next to plain
+    strings that weigh 1. It is still the list of its words, so enumerating and indexing work
+    as for any category (combinatorial and --unique modes ignore the weights); random draws go
+    through draw_index, which uses alias tables (Vose) built once here: one random number and
+    two lookups per draw, whatever the size or skew of the category.
+    """
+
+    def __init__(self, words: Iterable[str], weights: Iterable[float]):
+        super().__init__(words)
+        self.weights = [float(w) for w in weights]
+        n = len(self)
+        if len(self.weights) != n or not n:
+            raise ValueError("one weight per word is needed")
+        total = sum(self.weights)
+        scaled = [w * n / total for w in self.weights]
+        prob, alias = [1.0] * n, list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            prob[s], alias[s] = scaled[s], l
+            scaled[l] += scaled[s] - 1.0
+            (small if scaled[l] < 1.0 else large).append(l)
+        # Sentinella: se random() * n arrotonda a n, si ricade sull'ultima parola
+        self._prob = prob + [0.0]
+        self._alias = alias + [n - 1]
+        self._n = n
+
+    def draw_index(self, rng=random) -> int:
+        """Index of a word drawn with probability weight / total weight."""
+        u = rng.random() * self._n
+        i = int(u)
+        return i if u - i < self._prob[i] else self._alias[i]
+
+    def with_words(self, words: list[str]) -> "WeightedWords":
+        """Same weights and alias tables for another list of words of the same length (grammar forms)."""
+        other = WeightedWords.__new__(WeightedWords)
+        list.__init__(other, words)
+        other.__dict__.update(self.__dict__)
+        return other
+
+    def __add__(self, other):
+        return concat_words(self, other)
+
+    @classmethod
+    def from_entries(cls, category: str, entries: list) -> list[str]:
+        """A JSON list as a plain list of strings, or as WeightedWords if any entry has a weight."""
+        if all(isinstance(e, str) for e in entries):
+            return entries
+        words, weights = [], []
+        for e in entries:
+            if isinstance(e, str):
+                word, w = e, 1
+            elif isinstance(e, dict) and isinstance(e.get("word"), str):
+                word, w = e["word"], e.get("w", 1)
+            else:
+                raise ValueError(f"❌ Categoria '{category}': voce non valida {e!r} "
+                                 f"(usa una stringa o {{\"word\": ..., \"w\": peso}})")
+            if isinstance(w, bool) or not isinstance(w, (int, float)) or not 0 < w < float("inf"):
+                raise ValueError(f"❌ Categoria '{category}': peso non valido {w!r} per '{word}' (serve un numero > 0)")
+            words.append(word)
+            weights.append(w)
+        return cls(words, weights)
+
+def concat_words(a: list[str], b: list[str]) -> list[str]:
+    """a + b, keeping the weights if either list has them (plain words weigh 1)."""
+    if not isinstance(a, WeightedWords) and not isinstance(b, WeightedWords):
+        return a + b
+    weights = [getattr(a, "weights", None) or [1.0] * len(a), getattr(b, "weights", None) or [1.0] * len(b)]
+    return WeightedWords(list.__add__(a, b), weights[0] + weights[1])
+
+def _parts_from_data(data, path: list = None) -> dict[str, list[str]]:
+    """Selects the substructure at path from already decoded JSON and flattens it."""
+    import json
+    try:
+        if data is None:
+            raise ValueError("Could not load JSON file or invalid encoding.")
+        if path:
+            for key in path:
+                data = data[key]
+        flat_parts = flatten_dict(data)
+        if not flat_parts:
+            raise ValueError("No valid list found in the JSON.")
+        # Voci con peso ({"word": ..., "w": ...}): tabelle alias costruite qui, una volta
+        return {k: WeightedWords.from_entries(k, v) for k, v in flat_parts.items()}
+    except (FileNotFoundError, json.JSONDecodeError, ValueError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return {}
+
+def load_parts(filename: str, path: list = None) -> dict[str, list[str]]:
+    """Loads a substructure from the JSON and flattens any subcategories recursively."""
+    return _parts_from_data(load_json_with_encoding(filename), path)
+    
+def _patterns_from_data(data, key):
+    """Returns the pattern list stored under key, at root or in "prompt_dictionary"."""
+    try:
+        if data is None:
+            raise ValueError("Could not load JSON file or invalid encoding.")
+        # Search both at root and in "prompt_dictionary"
+        result = data.get(key, [])
+        if not result and "prompt_dictionary" in data:
+            result = data["prompt_dictionary"].get(key, [])
+        return result
+    except Exception as e:
+        print(f"ERROR loading patterns: {e}", file=sys.stderr)
+        return []
+
+def load_patterns(filename, key):
+    """
+    Loads a list of patterns (short or long) from the JSON file.
+    """
+    return _patterns_from_data(load_json_with_encoding(filename), key)
+
+
+# --- Dizionario caricato (cache) ---
+
+DICTIONARY_PATH = ["prompt_dictionary", "Dictionary"]
+
+def _empty_categories(data, path: list) -> list[str]:
+    """Categories that are in the JSON but have no words (flatten_dict leaves them out)."""
+    try:
+        for key in path:
+            data = data[key]
+    except (KeyError, TypeError, IndexError):
+        return []
+    if not isinstance(data, dict):
+        return []
+    empty = []
+    for k, v in data.items():
+        if isinstance(v, list) and not v:
+            empty.append(k)
+        elif isinstance(v, dict):
+            if not any(isinstance(sub, list) and sub for sub in v.values()):
+                empty.append(k)
+            empty.extend(f"{k}_{subk}" for subk, sub in v.items() if isinstance(sub, list) and not sub)
+    return empty
+
+def add_alias_categories(parts: dict[str, list[str]]) -> dict[str, list[str]]:
+    """Adds the Nouns/Verbs singular, plural and merged aliases in place."""
+    # Fallback: se mancano Nouns_singular/plural o Verbs_singular/plural, cerca di crearli
+    if "Nouns_singular" not in parts and "Nouns" in parts:
+        parts["Nouns_singular"] = parts["Nouns"]
+    if "Nouns_plural" not in parts and "Nouns" in parts:
+        parts["Nouns_plural"] = parts["Nouns"]
+    if "Verbs_singular" not in parts and "Verbs" in parts:
+        parts["Verbs_singular"] = parts["Verbs"]
+    if "Verbs_plural" not in parts and "Verbs" in parts:
+        parts["Verbs_plural"] = parts["Verbs"]
+
+    # Alias automatici per Nouns e Verbs (unione di singolare e plurale)
+    if "Nouns_singular" in parts and "Nouns_plural" in parts:
+        parts["Nouns"] = concat_words(parts["Nouns_singular"], parts["Nouns_plural"])
+    if "Verbs_singular" in parts and "Verbs_plural" in parts:
+        parts["Verbs"] = concat_words(parts["Verbs_singular"], parts["Verbs_plural"])
+    return parts
+
+
+class LoadedDictionary:
+    """
+    One input file, decoded and flattened once: the parts (with Nouns/Verbs aliases) and the
+    short/long patterns. Compiled patterns are built on first use and kept with it, and so is
+    the check of their placeholders (problems). empty: categories the file lists without words.
+    Treat parts and patterns as read-only, the object is shared through the cache.
+    """
+
+    def __init__(self, path: str, parts: dict[str, list[str]], patterns: dict[str, list[str]],
+                 empty: Iterable[str] = ()):
+        self.path = path
+        self.parts = parts
+        self.patterns = patterns
+        self.empty = list(empty)
+        self._problems = {}
+        # Solo per i dizionari uniti da più temi (merge_themes): nomi dei temi e, per categoria,
+        # [(tema, primo indice, fine)] delle sue parole nella lista unita
+        self.themes: list[str] = []
+        self.provenance: dict[str, list[tuple[str, int, int]]] = {}
+        # Flag grammaticali per parola, calcolati al primo pattern da compilare
+        self._grammar = None
+        self._compiled = {}
+
+    @property
+    def grammar(self) -> dict[int, "WordGrammar"]:
+        if self._grammar is None:
+            self._grammar = analyse_parts(self.parts)
+        return self._grammar
+
+    def compiled(self, key: str) -> list["CompiledPattern"]:
+        """Patterns_short / Patterns_long compiled against this dictionary's parts."""
+        if key not in self._compiled:
+            self._compiled[key] = compile_patterns(self.patterns.get(key, []), self.parts, self.grammar)
+        return self._compiled[key]
+
+    def problems(self, key: str) -> list[str]:
+        """
+        Every pattern of key that does not fully resolve, one line each (see pattern_problems),
+        worked out once per dictionary: [] means each placeholder has a word list in both forms.
+        """
+        if key not in self._problems:
+            self._problems[key] = pattern_problems(key, self.patterns.get(key, []), self.compiled(key), self.empty)
+        return self._problems[key]
+
+    def theme_of(self, category: str, index: int) -> "str | None":
+        """The theme word `index` of a merged category comes from (None for a single file)."""
+        spans = self.provenance.get(category)
+        if not spans:
+            return None
+        k = bisect.bisect_right([start for _, start, _ in spans], index) - 1
+        return spans[k][0] if k >= 0 and index < spans[k][2] else None
+
+    @classmethod
+    def from_data(cls, path: str, data) -> "LoadedDictionary":
+        parts = add_alias_categories(_parts_from_data(data, DICTIONARY_PATH))
+        patterns = {key: _patterns_from_data(data, key) for key in ("Patterns_short", "Patterns_long")}
+        # Una categoria vuota può essere riempita dagli alias (Nouns_plural da Nouns)
+        empty = [c for c in _empty_categories(data, DICTIONARY_PATH) if c not in parts]
+        return cls(path, parts, patterns, empty)
+
+    def to_state(self) -> dict:
+        """
+        Everything the binary cache needs, as plain lists, dicts and strings (see compile_dictionary):
+        every word list once in a pool, parts and compiled patterns pointing into it by index.
+        """
+        pool, index, weights = [], {}, {}
+
+        def table(words):
+            if id(words) not in index:
+                index[id(words)] = len(pool)
+                if isinstance(words, WeightedWords):
+                    weights[len(pool)] = words.weights
+                pool.append(list(words))
+            return index[id(words)]
+
+        parts = {category: table(words) for category, words in self.parts.items()}
+        compiled = {key: [p.to_state(table) for p in self.compiled(key)] for key in self.patterns}
+        return {"tables": pool, "weights": weights, "parts": parts, "patterns": self.patterns,
+                "empty": self.empty, "compiled": compiled}
+
+    @classmethod
+    def from_state(cls, path: str, state: dict) -> "LoadedDictionary":
+        """Rebuilds a dictionary saved by to_state, compiled patterns included, without analysing it again."""
+        tables = state["tables"]
+        for i, weights in state["weights"].items():
+            tables[i] = WeightedWords(tables[i], weights)
+        dictionary = cls(path, {category: tables[i] for category, i in state["parts"].items()}, state["patterns"],
+                         state["empty"])
+        for key, patterns in state["compiled"].items():
+            dictionary._compiled[key] = [CompiledPattern.from_state(p, tables) for p in patterns]
+        return dictionary
+
+
+# path assoluto -> ((mtime, size), LoadedDictionary)
+_DICTIONARY_CACHE: dict[str, tuple] = {}
+
+def load_dictionary(filename: str, stats: "RunStats" = None) -> LoadedDictionary:
+    """
+    Returns the LoadedDictionary for filename, reading the file only if it changed since the
+    last call (same path, mtime and size means no file I/O and no flattening). A binary cache
+    written by the compile command is used instead of the JSON while it matches the file.
+    """
+    path = os.path.abspath(filename)
+    try:
+        st = os.stat(path)
+        key = (st.st_mtime_ns, st.st_size)
+    except OSError:
+        key = None
+    cached = _DICTIONARY_CACHE.get(path)
+    if cached is not None and key is not None and cached[0] == key:
+        if stats is not None:
+            stats.dictionary_source = "memory cache"
+        return cached[1]
+
+    dictionary = load_binary_cache(path, key) if key is not None else None
+    if dictionary is not None:
+        if stats is not None:
+            stats.dictionary_source = "binary cache"
+        _DICTIONARY_CACHE[path] = (key, dictionary)
+        return dictionary
+
+    if stats is not None:
+        stats.dictionary_source = "json"
+    data = load_json_with_encoding(filename, None if stats is None else stats.encodings_tried)
+    dictionary = LoadedDictionary.from_data(path, data)
+    # Non mettere in cache i caricamenti falliti, al prossimo batch si riprova
+    if key is not None and data is not None and dictionary.parts:
+        _DICTIONARY_CACHE[path] = (key, dictionary)
+    return dictionary
+
+
+# --- Temi: più dizionari uniti in uno ---
+
+# Thread che leggono i file dei temi: il lavoro è soprattutto I/O e decodifica del JSON
+THEME_LOAD_WORKERS = 8
+
+def theme_files(inputs: "str | Iterable[str]") -> list[str]:
+    """Input files in order; a folder stands for the .json files directly inside it, sorted by name."""
+    if isinstance(inputs, str):
+        inputs = [inputs]
+    files = []
+    for name in inputs:
+        if os.path.isdir(name):
+            files.extend(sorted(os.path.join(name, f) for f in os.listdir(name)
+                                if f.lower().endswith(".json") and os.path.isfile(os.path.join(name, f))))
+        else:
+            files.append(name)
+    return files
+
+def theme_name(filename: str) -> str:
+    """fantasy/creatures.json -> creatures."""
+    return os.path.splitext(os.path.basename(filename))[0]
+
+def parse_mix(text: str) -> tuple[str, float]:
+    """--mix item: "fantasy=3" -> ("fantasy", 3.0)."""
+    name, sep, ratio = text.partition("=")
+    try:
+        value = float(ratio) if sep and name else 0.0
+    except ValueError:
+        value = 0.0
+    if not value > 0 or value == float("inf"):
+        raise ValueError(f"expected THEME=RATIO with RATIO > 0: {text}")
+    return name, value
+
+def merge_themes(themes: list[tuple[str, LoadedDictionary]], mix: dict[str, float] = None) -> LoadedDictionary:
+    """
+    One dictionary from several themes, as if their files were a single JSON: each category
+    lists the words of every theme that has it, in theme order, and the patterns of all themes
+    are pooled (repeats once). Nouns/Verbs are rebuilt from the merged singular and plural lists.
+
+    mix gives themes a share of the draws ({"fantasy": 3, "scifi": 1}, 1 for themes not listed):
+    where several themes fill a category, each one's words together get its share, spread by
+    their own weights. Without mix every word counts the same, whatever theme it comes from.
+    Pattern choice stays uniform over the pooled patterns.
+    """
+    sources: dict[str, list[tuple[str, list[str]]]] = {}
+    for name, dictionary in themes:
+        for category, words in dictionary.parts.items():
+            if category not in _PLURAL_AWARE:
+                sources.setdefault(category, []).append((name, words))
+    for category in _PLURAL_AWARE:
+        singular, plural = sources.get(f"{category}_singular"), sources.get(f"{category}_plural")
+        if singular and plural:
+            sources[category] = singular + plural
+        else:
+            # Temi con solo Nouns/Verbs uniti (e nessun singolare/plurale da cui ricostruirli)
+            sources[category] = [(name, d.parts[category]) for name, d in themes if category in d.parts]
+            if not sources[category]:
+                del sources[category]
+
+    parts, provenance = {}, {}
+    for category, segments in sources.items():
+        spans, start = [], 0
+        for name, words in segments:
+            spans.append((name, start, start + len(words)))
+            start += len(words)
+        provenance[category] = spans
+        mixed = mix and len({name for name, _ in segments}) > 1
+        if len(segments) == 1:
+            parts[category] = segments[0][1]
+        elif mixed or any(isinstance(words, WeightedWords) for _, words in segments):
+            # Una sola lista (e tabella alias) per categoria, non una concatenazione per tema
+            words, weights = [], []
+            for name, segment in segments:
+                own = getattr(segment, "weights", None) or [1.0] * len(segment)
+                scale = mix.get(name, 1.0) / sum(own) if mixed else 1.0
+                words.extend(segment)
+                weights.extend(w * scale for w in own)
+            parts[category] = WeightedWords(words, weights)
+        else:
+            parts[category] = list(itertools.chain.from_iterable(words for _, words in segments))
+
+    patterns = {key: list(dict.fromkeys(p for _, d in themes for p in d.patterns.get(key, [])))
+                for key in ("Patterns_short", "Patterns_long")}
+    empty = sorted({c for _, d in themes for c in d.empty} - set(parts))
+    merged = LoadedDictionary(", ".join(d.path for _, d in themes), parts, patterns, empty)
+    merged.themes = [name for name, _ in themes]
+    merged.provenance = provenance
+    return merged
+
+def _remember(cache: dict, key, value, size: int):
+    """Stores value under key as the most recent entry, dropping the oldest beyond size (a small LRU)."""
+    cache.pop(key, None)
+    cache[key] = value
+    while len(cache) > size:
+        del cache[next(iter(cache))]
+
+# (file dei temi, mix) -> (dizionari dei temi, dizionario unito): finché nessun tema cambia,
+# anche l'unione e i suoi pattern compilati restano quelli. Limitata: con serve il mix
+# arriva dalla query, ogni mix diverso terrebbe in memoria un dizionario unito in più
+THEMES_CACHE_SIZE = 8
+_THEMES_CACHE: dict[tuple, tuple] = {}
+
+def load_themes(files: list[str], stats: "RunStats" = None, mix: dict[str, float] = None) -> LoadedDictionary:
+    """
+    Loads every theme file in a thread pool, each through load_dictionary (so a theme that did not
+    change comes from the memory or binary cache, and only new or edited files are parsed), then
+    merges them with merge_themes. Themes that fail to load are reported and left out.
+    Raises ValueError for two themes with the same name or a mix naming an unknown theme.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    names = [theme_name(f) for f in files]
+    repeated = sorted({n for n in names if names.count(n) > 1})
+    if repeated:
+        raise ValueError(f"❌ Temi con lo stesso nome: {', '.join(repeated)} (rinomina i file).")
+    mix = dict(mix or {})
+    unknown = sorted(set(mix) - set(names))
+    if unknown:
+        raise ValueError(f"❌ --mix: temi sconosciuti {', '.join(unknown)} (temi: {', '.join(names)}).")
+
+    theme_stats = [RunStats() for _ in files]
+    with ThreadPoolExecutor(max_workers=max(1, min(THEME_LOAD_WORKERS, len(files))),
+                            thread_name_prefix="themes") as pool:
+        loaded = list(pool.map(load_dictionary, files, theme_stats))
+
+    themes = []
+    for name, dictionary, theme in zip(names, loaded, theme_stats):
+        if dictionary.parts:
+            themes.append((name, dictionary))
+        else:
+            print(f"⚠️ Tema '{name}' ignorato: dizionario non valido o vuoto.")
+        if stats is not None:
+            stats.encodings_tried.extend(theme.encodings_tried)
+            stats.themes[name] = {"path": dictionary.path, "source": theme.dictionary_source,
+                                  "categories": len(dictionary.parts), "ratio": mix.get(name, 1.0)}
+    if stats is not None:
+        stats.dictionary_source = "themes"
+
+    key = (tuple(os.path.abspath(f) for f in files), tuple(sorted(mix.items())))
+    cached = _THEMES_CACHE.get(key)
+    if cached is not None and len(cached[0]) == len(themes) and all(a is b for a, (_, b) in zip(cached[0], themes)):
+        _remember(_THEMES_CACHE, key, cached, THEMES_CACHE_SIZE)
+        return cached[1]
+    merged = merge_themes(themes, mix)
+    if themes:
+        _remember(_THEMES_CACHE, key, (tuple(d for _, d in themes), merged), THEMES_CACHE_SIZE)
+    return merged
+
+def load_input(inputs: "str | list[str]", stats: "RunStats" = None, mix: dict[str, float] = None) -> LoadedDictionary:
+    """
+    The dictionary for --input: one JSON file as before (load_dictionary), or several files
+    and/or folders of theme files merged into one (load_themes).
+    """
+    files = theme_files(inputs)
+    if len(files) == 1 and not mix:
+        return load_dictionary(files[0], stats)
+    return load_themes(files, stats, mix)
+
+def input_label(inputs: "str | list[str]") -> str:
+    """Short name of an --input for messages: the file name, or the names joined."""
+    if isinstance(inputs, str):
+        return os.path.basename(inputs)
+    return ", ".join(os.path.basename(os.path.normpath(i)) for i in inputs)
+
+
+# --- Cache binaria del dizionario (comando compile) ---
+
+# Da incrementare quando cambia il modo di compilare i pattern: le cache vecchie vengono ignorate
+CACHE_VERSION = 3
+CACHE_SUFFIX = ".mpgc"
+# magic, versione del formato, versione di Python (marshal), mtime_ns e dimensione del JSON
+_CACHE_MAGIC = b"MPGC"
+_CACHE_HEADER = "<4sHBBqq"
+
+def cache_path(filename: str) -> str:
+    """The binary cache of a dictionary: template.json -> template.json.mpgc, in the same folder."""
+    return filename + CACHE_SUFFIX
+
+def load_binary_cache(path: str, key: tuple) -> "LoadedDictionary | None":
+    """
+    Loads the compiled dictionary from the cache file next to path if it was compiled from
+    this exact file (same mtime and size) by this program and Python version. Returns None
+    otherwise, and says so when the cache exists but is out of date.
+    """
+    import marshal
+    import struct
+    header = struct.Struct(_CACHE_HEADER)
+    try:
+        with open(cache_path(path), "rb") as f:
+            # Prima solo l'intestazione: una cache vecchia non viene letta tutta
+            head = f.read(header.size)
+            if len(head) < header.size:
+                return None
+            magic, version, major, minor, mtime_ns, size = header.unpack(head)
+            if (magic, version, major, minor) != (_CACHE_MAGIC, CACHE_VERSION, *sys.version_info[:2]):
+                return None
+            if (mtime_ns, size) != key:
+                print(f"⚠️ {os.path.basename(cache_path(path))} is out of date, reading the JSON "
+                      f"(run 'compile' again to refresh it).")
+                return None
+            # marshal non sa leggere a pezzi: il resto del file si legge in una volta
+            state = marshal.loads(f.read())
+    except (OSError, ValueError, EOFError, TypeError):
+        # Nessuna cache (il caso normale) o file illeggibile: si usa il JSON
+        return None
+    return LoadedDictionary.from_state(path, state)
+
+def compile_dictionary(filename: str) -> tuple[str, LoadedDictionary]:
+    """
+    Reads a dictionary from its JSON, compiles every pattern and writes the binary cache next to
+    it, replacing any previous one atomically. Returns (cache file, dictionary).
+    Raises ValueError if the file has no usable categories or patterns.
+    """
+    import marshal
+    import struct
+    path = os.path.abspath(filename)
+    st = os.stat(path)
+    data = load_json_with_encoding(path)
+    dictionary = LoadedDictionary.from_data(path, data)
+    if data is None or not dictionary.parts:
+        raise ValueError(f"❌ {filename}: nessuna categoria valida, cache non scritta.")
+    if not any(dictionary.patterns.values()):
+        raise ValueError(f"❌ {filename}: nessun pattern corto o lungo, cache non scritta.")
+
+    header = struct.pack(_CACHE_HEADER, _CACHE_MAGIC, CACHE_VERSION, *sys.version_info[:2],
+                         st.st_mtime_ns, st.st_size)
+    target = cache_path(path)
+    tmp = f"{target}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(header)
+            f.write(marshal.dumps(dictionary.to_state()))
+        os.replace(tmp, target)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return target, dictionary
+
+def compile_command(argv: list[str]) -> int:
+    """python prompt_generator.py compile [file.json ...]: writes the binary caches, returns the exit code."""
+    import argparse
+    parser = argparse.ArgumentParser(prog="prompt_generator.py compile",
+                                     description="Compila i dizionari JSON in una cache binaria per un avvio più rapido.")
+    parser.add_argument("inputs", nargs="*", default=["prompt_parts.json"], help="File JSON da compilare (o cartelle di temi)")
+    args = parser.parse_args(argv)
+    failed = 0
+    for filename in theme_files(args.inputs):
+        try:
+            start = time.perf_counter()
+            target, dictionary = compile_dictionary(filename)
+        except (OSError, ValueError) as e:
+            print(f"ERROR: {e}", file=sys.stderr)
+            failed += 1
+            continue
+        patterns = sum(len(p) for p in dictionary.patterns.values())
+        print(f"📦 {filename} -> {target} ({len(dictionary.parts)} categories, {patterns} patterns, "
+              f"{os.path.getsize(target) / 1024:.1f} KB, {time.perf_counter() - start:.3f} s)")
+        warn_problems(dictionary)
+    return 1 if failed else 0
+
+def get_next_output_filename(base: str = "invoke_prompts", outdir: str = "", ext: str = ".txt",
+                             create: bool = True) -> str:
+    """
+    Restituisce il prossimo nome file disponibile in formato invoke_prompts_001.txt, _002.txt, ecc.
+    Se outdir è specificato, salva nella cartella indicata.
+    One directory scan finds the highest number in use (any extension, rotated parts included)
+    and the next one is created empty with O_EXCL: two runs started together never get the same
+    name, the second one moves on to the following number. create=False only returns the name.
+    """
+    taken = re.compile(rf"{re.escape(base)}_(\d+)(?:[._]|$)")
+    highest = 0
+    try:
+        with os.scandir(outdir or ".") as entries:
+            for entry in entries:
+                match = taken.match(entry.name)
+                if match:
+                    highest = max(highest, int(match[1]))
+    except FileNotFoundError:
+        pass
+    if create and outdir:
+        os.makedirs(outdir, exist_ok=True)
+    i = highest + 1
+    while True:
+        fname = f"{base}_{i:03d}{ext}"
+        fullpath = os.path.join(outdir, fname) if outdir else fname
+        if not create:
+            return fullpath
+        try:
+            os.close(os.open(fullpath, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666))
+            return fullpath
+        except FileExistsError:
+            i += 1
+
+def release_output_filename(path: str):
+    """Gives back a name reserved by get_next_output_filename if nothing was written to it."""
+    with contextlib.suppress(FileNotFoundError):
+        if os.path.getsize(path) == 0:
+            os.remove(path)
+
+# Buffer grande per il file e scritture a blocchi di prompt già uniti
+WRITE_BUFFER_SIZE = 1 << 20
+WRITE_CHUNK_PROMPTS = 4096
+PROMPT_SEPARATOR = "\n_\n"
+
+def chunk_prompts(prompts: Iterable[str], size: int = WRITE_CHUNK_PROMPTS) -> Iterator[tuple[str, int]]:
+    """Groups prompts into (text joined with the separator, number of prompts) blocks."""
+    chunk = []
+    for p in prompts:
+        chunk.append(p)
+        if len(chunk) >= size:
+            yield PROMPT_SEPARATOR.join(chunk), len(chunk)
+            chunk.clear()
+    if chunk:
+        yield PROMPT_SEPARATOR.join(chunk), len(chunk)
+
+# Formati di output: testo semplice o una riga JSON per prompt, compressi a blocchi
+OUTPUT_FORMATS = ("txt", "jsonl")
+COMPRESSION_SUFFIXES = {"none": "", "gzip": ".gz", "xz": ".xz"}
+INDEX_SUFFIX = ".idx"
+INDEX_VERSION = 1
+# Livelli predefiniti: xz oltre 3 comprime poco di più ma diventa molte volte più lento
+DEFAULT_COMPRESS_LEVELS = {"gzip": 6, "xz": 3}
+COMPRESS_LEVEL_RANGES = {"gzip": (1, 9), "xz": (0, 9)}
+
+def _encode_block(text: str, fmt: str, first: bool) -> bytes:
+    """One block of prompts as bytes of the output format (txt: separator before all but the first)."""
+    if fmt == "jsonl":
+        # Stesso testo di json.dumps(p, ensure_ascii=False), senza il costo di dumps per ogni prompt
+        from json.encoder import encode_basestring
+        # I prompt non contengono "\n": dividere sul separatore dà esattamente i prompt del blocco
+        return ("\n".join(map(encode_basestring, text.split(PROMPT_SEPARATOR))) + "\n").encode("utf-8")
+    return (text if first else PROMPT_SEPARATOR + text).encode("utf-8")
+
+def _codec(compression: str, level: int = None):
+    """(compress, decompress) for one independent block: gzip members or xz streams."""
+    if level is None:
+        level = DEFAULT_COMPRESS_LEVELS.get(compression)
+    elif compression in COMPRESS_LEVEL_RANGES:
+        low, high = COMPRESS_LEVEL_RANGES[compression]
+        if not low <= level <= high:
+            raise ValueError(f"❌ Livello {compression} {level} non valido ({low}-{high}).")
+    if compression == "gzip":
+        import gzip
+        return (lambda data: gzip.compress(data, compresslevel=level, mtime=0)), gzip.decompress
+    if compression == "xz":
+        import lzma
+        return (lambda data: lzma.compress(data, preset=level)), lzma.decompress
+    return (lambda data: data), (lambda data: data)
+
+def output_filename(filename: str, compression: str = "none") -> str:
+    """filename with the compression suffix added if it does not have it yet (prompts.txt -> prompts.txt.gz)."""
+    suffix = COMPRESSION_SUFFIXES[compression]
+    return filename if filename.endswith(suffix) else filename + suffix
+
+def _write_indexed(blocks: Iterable[tuple[str, int]], f, fmt: str, compression: str,
+                   level: int = None, checkpoint: "Checkpoint" = None) -> tuple[int, int, float, list]:
+    """
+    Block layout: every block of prompts is encoded and compressed on its own and appended to f.
+    gzip and xz read the concatenated blocks as one file (zcat, xzcat), and each block can be
+    decoded alone. Returns (prompts, uncompressed bytes, write seconds, index entries).
+    A resumed checkpoint supplies the counters and entries of the part already in f.
+    """
+    compress = _codec(compression, level)[0]
+    entries, count, offset, raw_bytes, write_time = [], 0, 0, 0, 0.0
+    if checkpoint is not None:
+        entries, count, offset, raw_bytes = checkpoint.entries, checkpoint.prompts, checkpoint.bytes, checkpoint.raw_bytes
+    for text, n in blocks:
+        if not n:
+            continue
+        start = time.perf_counter()
+        data = _encode_block(text, fmt, not count)
+        raw_bytes += len(data)
+        data = compress(data)
+        f.write(data)
+        if not count:
+            f.flush()
+        write_time += time.perf_counter() - start
+        # Indice: primo prompt del blocco, posizione e lunghezza nel file
+        entries.append([count, offset, len(data)])
+        offset += len(data)
+        count += n
+        if checkpoint is not None and checkpoint.due(count):
+            checkpoint.save(f, count, offset, raw_bytes, entries)
+    return count, raw_bytes, write_time, entries
+
+def write_prompt_blocks(blocks: Iterable[tuple[str, int]], filename: str, stats: "RunStats" = None,
+                        fmt: str = "txt", compression: str = "none", index: bool = False,
+                        level: int = None, checkpoint: "Checkpoint" = None) -> int:
+    """
+    Writes blocks of already joined prompts (see chunk_prompts) in UTF-8, separated by "\n_\n".
+    The first block is flushed right away; memory does not grow with the number of prompts.
+    fmt "jsonl" writes one JSON string per line instead. With compression ("gzip", "xz"),
+    another format or index=True, the file is written in independent blocks and a sidecar
+    filename + ".idx" records where each block starts (see PromptReader). level: gzip level or
+    xz preset, DEFAULT_COMPRESS_LEVELS if None.
+    checkpoint: saved every checkpoint.every prompts; when resuming, the file is cut back to the
+    checkpoint and the blocks (which then start after it) are appended. The checkpoint file is
+    removed once the output is complete.
+    Returns how many prompts were written. Errors (of the generation or of the disk) propagate;
+    the last checkpoint is left in place so the run can be resumed.
+    """
+    count = 0
+    write_time = 0.0
+    indexed = index or fmt != "txt" or compression != "none"
+    outdir = os.path.dirname(filename)
+    if outdir and not os.path.exists(outdir):
+        os.makedirs(outdir)
+    append = checkpoint is not None and checkpoint.prompts > 0
+    if append:
+        # Quello che c'è dopo l'ultimo checkpoint potrebbe essere un blocco scritto a metà
+        os.truncate(filename, checkpoint.bytes)
+
+    if indexed:
+        with open(filename, "ab" if append else "wb", buffering=WRITE_BUFFER_SIZE) as f:
+            count, raw_bytes, write_time, entries = _write_indexed(blocks, f, fmt, compression, level, checkpoint)
+        write_index(filename, fmt, compression, count, raw_bytes, entries)
+    else:
+        if append:
+            count = checkpoint.prompts
+        with open(filename, "a" if append else "w", encoding="utf-8", buffering=WRITE_BUFFER_SIZE) as f:
+            for text, n in blocks:
+                if not n:
+                    continue
+                # Separatore prima di ogni blocco tranne il primo: nessun "_" finale
+                start = time.perf_counter()
+                f.write((PROMPT_SEPARATOR if count else "") + text)
+                if not count:
+                    f.flush()
+                write_time += time.perf_counter() - start
+                count += n
+                if checkpoint is not None and checkpoint.due(count):
+                    checkpoint.save(f, count)
+    if checkpoint is not None:
+        checkpoint.finish()
+    size = os.path.getsize(filename)
+    if not indexed:
+        raw_bytes = size
+    if stats is not None:
+        stats.prompts += count
+        stats.bytes_written += size
+        stats.bytes_uncompressed += raw_bytes
+        stats.stages["write"] = stats.stages.get("write", 0.0) + write_time
+    print(f"✅ {count} prompts generated and saved in {filename} (UTF-8 encoding)")
+    if compression != "none":
+        rate = f", {raw_bytes / write_time / 1e6:.1f} MB/s" if write_time else ""
+        print(f"   {compression}: {raw_bytes} -> {size} bytes (ratio {raw_bytes / max(size, 1):.2f}x{rate}), "
+              f"index in {filename + INDEX_SUFFIX}")
+    return count
+
+def write_prompts(prompts: Iterable[str], filename: str, fmt: str = "txt", compression: str = "none",
+                  index: bool = False, level: int = None) -> int:
+    """
+    Writes the generated prompts to a file in UTF-8 encoding, separated by "\n_\n".
+    Prompts may come from a generator: they are written in chunks as they arrive.
+    CompactPrompts are turned into text here, one chunk at a time.
+    fmt, compression, index and level: see write_prompt_blocks.
+    Returns how many prompts were written.
+    """
+    blocks = prompts.blocks() if isinstance(prompts, CompactPrompts) else chunk_prompts(prompts)
+    return write_prompt_blocks(blocks, filename, fmt=fmt, compression=compression, index=index, level=level)
+
+# --- Checkpoint per i run lunghi (--checkpoint-every, --resume) ---
+
+CHECKPOINT_SUFFIX = ".ckpt"
+CHECKPOINT_VERSION = 1
+
+def dictionary_hash(inputs: "str | list[str]") -> str:
+    """SHA-256 of the bytes of every input file (themes in order): a resumed run must use the same words."""
+    import hashlib
+    digest = hashlib.sha256()
+    for filename in theme_files(inputs):
+        with open(filename, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+def read_checkpoint(filename: str) -> dict:
+    """The checkpoint saved for output filename. Raises ValueError if there is none or it is unreadable."""
+    import json
+    path = filename + CHECKPOINT_SUFFIX
+    try:
+        with open(path, encoding="utf-8") as f:
+            saved = json.load(f)
+    except FileNotFoundError:
+        raise ValueError(f"❌ --resume: nessun checkpoint {path} (il run era già completo?).") from None
+    except (OSError, ValueError) as e:
+        raise ValueError(f"❌ --resume: checkpoint {path} illeggibile: {e}") from None
+    if saved.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(f"❌ --resume: {path} è di un'altra versione del programma.")
+    return saved
+
+class Checkpoint:
+    """
+    Progress of a long run, saved next to the output (prompts.txt -> prompts.txt.ckpt) every
+    `every` prompts, at a block boundary and after the output has been flushed to disk:
+    prompts written, output size in bytes (and the uncompressed size and index entries for
+    block-compressed or indexed output), and `run`, the options that decide the output, seed
+    and dictionary hash included. Seeded random runs are rendered in shards of SHARD_SIZE seeded
+    from (seed, shard), so the prompt count alone says where generation continues (shard =
+    prompts // SHARD_SIZE); combinatorial runs continue at offset + prompts.
+    """
+
+    def __init__(self, filename: str, run: dict, every: int, saved: dict = None):
+        """saved: read_checkpoint() of the run to resume. Raises ValueError if it does not match."""
+        import json
+        self.filename = filename
+        self.path = filename + CHECKPOINT_SUFFIX
+        # Come tornerà dal JSON (tuple -> liste), per confrontarlo con quello salvato
+        self.run = json.loads(json.dumps(run))
+        self.every = every
+        self.prompts = self.bytes = self.raw_bytes = 0
+        self.entries = []
+        if saved is not None:
+            changed = sorted(k for k in set(self.run) | set(saved["run"]) if self.run.get(k) != saved["run"].get(k))
+            if changed:
+                raise ValueError(f"❌ --resume: il checkpoint è di un run diverso (cambiati: {', '.join(changed)}).")
+            size = os.path.getsize(filename) if os.path.exists(filename) else -1
+            if size < saved["bytes"]:
+                raise ValueError(f"❌ --resume: {filename} è più corto del checkpoint ({size} < {saved['bytes']} byte).")
+            self.prompts, self.bytes = saved["prompts"], saved["bytes"]
+            self.raw_bytes = saved.get("raw_bytes", self.bytes)
+            self.entries = saved.get("entries", [])
+        self._last = self.prompts
+
+    def due(self, count: int) -> bool:
+        return count - self._last >= self.every
+
+    def save(self, f, count: int, size: int = None, raw_bytes: int = None, entries: list = None):
+        """Flushes f to disk, then replaces the checkpoint file atomically."""
+        import json
+        f.flush()
+        os.fsync(f.fileno())
+        if size is None:
+            size = os.fstat(f.fileno()).st_size
+        state = {"version": CHECKPOINT_VERSION, "run": self.run, "every": self.every,
+                 "prompts": count, "shard": count // SHARD_SIZE, "bytes": size}
+        if entries is not None:
+            state["raw_bytes"] = raw_bytes
+            state["entries"] = entries
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as out:
+            json.dump(state, out, separators=(",", ":"))
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp, self.path)
+        self.prompts, self.bytes, self._last = count, size, count
+
+    def finish(self):
+        """The output is complete: the checkpoint is no longer needed."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def command(self) -> str:
+        """Command line that resumes this run."""
+        run = self.run
+        inputs = " ".join(f'"{i}"' for i in run["input"])
+        parts = [f'python prompt_generator.py -i {inputs} -o "{self.filename}" -m {run["mode"]} -n {run["num_prompts"]}']
+        parts += [flag for flag, on in (("--short", run["short"]), ("--long", run["long"])) if on]
+        for name in ("seed", "offset", "limit", "engine", "format", "compress", "compress_level"):
+            if run.get(name) not in (None, 0, "python", "txt", "none"):
+                parts.append(f"--{name.replace('_', '-')} {run[name]}")
+        if run["index"]:
+            parts.append("--index")
+        if run["mix"]:
+            parts.append("--mix " + " ".join(f"{k}={v:g}" for k, v in run["mix"]))
+        return " ".join(parts + ["--resume"])
+
+def checkpoint_run(args, seed: int, engine: str, options: dict) -> dict:
+    """The options of a run that decide its output, as saved in its checkpoint."""
+    mode = args.mode if args.mode in ("ran", "comb", "both") else "ran"
+    return {
+        "input": [os.path.abspath(f) for f in theme_files(args.input)],
+        "dictionary": dictionary_hash(args.input),
+        "mix": sorted((getattr(args, "mix", None) or {}).items()),
+        "mode": mode, "num_prompts": args.num_prompts, "seed": seed,
+        "short": bool(getattr(args, "short", False)), "long": bool(getattr(args, "long", False)),
+        "offset": getattr(args, "offset", 0) or 0, "limit": getattr(args, "limit", None),
+        "engine": engine, "format": options["fmt"], "compress": options["compression"],
+        "compress_level": options["level"], "index": bool(options["index"]),
+    }
+
+
+# --- Output a rotazione (più file per esecuzione) ---
+
+def parse_size(text: str) -> int:
+    """Byte count with an optional K, M or G suffix (powers of 1024): "500M" -> 524288000."""
+    text = text.strip().upper().removesuffix("B")
+    scale = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}.get(text[-1:], 1)
+    value = int(float(text[:-1] if scale > 1 else text) * scale)
+    if value <= 0:
+        raise ValueError(f"size must be positive: {text}")
+    return value
+
+def part_filename(filename: str, part: int) -> str:
+    """prompts.txt -> prompts_part001.txt (compression suffixes stay at the end: prompts_part001.txt.gz)."""
+    name, packed = filename, ""
+    for suffix in COMPRESSION_SUFFIXES.values():
+        if suffix and name.endswith(suffix):
+            name, packed = name[:-len(suffix)], suffix
+    root, ext = os.path.splitext(name)
+    return f"{root}_part{part:03d}{ext}{packed}"
+
+class _Rotation:
+    """
+    Splits a stream of prompt blocks into per-file block streams of at most max_prompts prompts
+    and max_bytes bytes of UTF-8 text (before compression). Blocks are cut at prompt boundaries
+    when needed; a single prompt larger than max_bytes still gets a file of its own.
+    """
+
+    def __init__(self, blocks: Iterable[tuple[str, int]], max_prompts: int = None, max_bytes: int = None):
+        self.blocks = iter(blocks)
+        self.max_prompts = max_prompts
+        self.max_bytes = max_bytes
+        self.pending = None
+
+    def _next(self):
+        if self.pending is not None:
+            block, self.pending = self.pending, None
+            return block
+        for block in self.blocks:
+            if block[1]:
+                return block
+        return None
+
+    def files(self) -> Iterator[Iterator[tuple[str, int]]]:
+        """One block iterator per file; each must be consumed before asking for the next."""
+        while True:
+            block = self._next()
+            if block is None:
+                return
+            self.pending = block
+            yield self._file()
+
+    def _file(self) -> Iterator[tuple[str, int]]:
+        prompts = size = 0
+        sep = len(PROMPT_SEPARATOR)
+        while (block := self._next()) is not None:
+            text, n = block
+            room = n if self.max_prompts is None else self.max_prompts - prompts
+            nbytes = len(text.encode("utf-8")) + (sep if prompts else 0) if self.max_bytes else 0
+            if n <= room and (not self.max_bytes or size + nbytes <= self.max_bytes):
+                prompts, size = prompts + n, size + nbytes
+                yield block
+                continue
+            # Il blocco non entra tutto: si prende il numero di prompt che ci sta
+            parts = text.split(PROMPT_SEPARATOR)
+            take = min(room, n)
+            if self.max_bytes:
+                fit, used = 0, size
+                for p in parts[:take]:
+                    used += len(p.encode("utf-8")) + (sep if prompts + fit else 0)
+                    if used > self.max_bytes:
+                        break
+                    fit += 1
+                take = fit if fit or prompts else 1
+            if take:
+                yield PROMPT_SEPARATOR.join(parts[:take]), take
+            self.pending = (PROMPT_SEPARATOR.join(parts[take:]), n - take)
+            return
+
+def write_rotating(blocks: Iterable[tuple[str, int]], filename: str, stats: "RunStats" = None,
+                   max_prompts: int = None, max_bytes: int = None, **options) -> int:
+    """
+    Like write_prompt_blocks (options: fmt, compression, index, level), but starts a new file,
+    filename_part001, _part002, ..., every max_prompts prompts or max_bytes bytes of text. Each
+    part is a complete output of its own (with its own index when indexed) and is closed before
+    the next one is started, so consumers can process a part as soon as the next one appears.
+    Returns how many prompts were written in total.
+    """
+    total = 0
+    for part, file_blocks in enumerate(_Rotation(blocks, max_prompts, max_bytes).files(), 1):
+        total += write_prompt_blocks(file_blocks, part_filename(filename, part), stats, **options)
+    return total
+
+def write_index(filename: str, fmt: str, compression: str, prompts: int, raw_bytes: int, entries: list):
+    import json
+    index = {
+        "version": INDEX_VERSION, "format": fmt, "compression": compression,
+        "prompts": prompts, "uncompressed_bytes": raw_bytes,
+        # [primo prompt, offset, lunghezza] per blocco
+        "blocks": entries,
+    }
+    with open(filename + INDEX_SUFFIX, "w", encoding="utf-8") as f:
+        json.dump(index, f, separators=(",", ":"))
+
+
+class PromptReader:
+    """
+    Random access to an output written with an index: prompt N, or a range, costs one seek and
+    the decoding of the block(s) holding it, whatever the size of the file.
+
+        with PromptReader("prompts.txt.gz") as reader:
+            reader[7_500_000], reader.range(10, 20), len(reader)
+    """
+
+    def __init__(self, filename: str):
+        import json
+        try:
+            with open(filename + INDEX_SUFFIX, encoding="utf-8") as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"{filename}{INDEX_SUFFIX} not found: write the file with --index, "
+                                    f"--compress or --format jsonl") from None
+        if index.get("version") != INDEX_VERSION:
+            raise ValueError(f"❌ {filename}{INDEX_SUFFIX}: unsupported index version {index.get('version')}")
+        self.filename = filename
+        self.format = index["format"]
+        self.compression = index["compression"]
+        self.prompts = index["prompts"]
+        self.blocks = index["blocks"]
+        self._firsts = [b[0] for b in self.blocks]
+        self._decompress = _codec(self.compression)[1]
+        self._file = open(filename, "rb")
+        # Ultimo blocco decodificato: letture vicine non lo decodificano di nuovo
+        self._cached = (None, None)
+
+    def __len__(self) -> int:
+        return self.prompts
+
+    def _block(self, k: int) -> list[str]:
+        if self._cached[0] != k:
+            first, offset, length = self.blocks[k]
+            self._file.seek(offset)
+            text = self._decompress(self._file.read(length)).decode("utf-8")
+            if self.format == "jsonl":
+                import json
+                prompts = [json.loads(line) for line in text.splitlines()]
+            else:
+                prompts = (text if k == 0 else text[len(PROMPT_SEPARATOR):]).split(PROMPT_SEPARATOR)
+            self._cached = (k, prompts)
+        return self._cached[1]
+
+    def __getitem__(self, n: int) -> str:
+        if n < 0:
+            n += self.prompts
+        if not 0 <= n < self.prompts:
+            raise IndexError(f"prompt {n} out of range ({self.prompts} prompts)")
+        k = bisect.bisect_right(self._firsts, n) - 1
+        return self._block(k)[n - self._firsts[k]]
+
+    def range(self, start: int, stop: int) -> list[str]:
+        """Prompts start..stop-1 (clipped to the file), decoding only the blocks they are in."""
+        start, stop = max(start, 0), min(stop, self.prompts)
+        out = []
+        while start < stop:
+            k = bisect.bisect_right(self._firsts, start) - 1
+            block = self._block(k)
+            take = block[start - self._firsts[k]:stop - self._firsts[k]]
+            out.extend(take)
+            start += len(take)
+        return out
+
+    def __iter__(self) -> Iterator[str]:
+        for k in range(len(self.blocks)):
+            yield from self._block(k)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def read_command(argv: list[str]) -> int:
+    """
+    python prompt_generator.py read FILE N | N:M  -- prints prompts through the index.
+    N:M reads like a Python slice: either bound may be left out or be negative (-10: is the last ten).
+    """
+    import argparse
+    parser = argparse.ArgumentParser(prog="prompt_generator.py read",
+                                     description="Legge il prompt N (o l'intervallo N:M) da un output con indice.")
+    parser.add_argument("file", help="File di output (con il suo .idx accanto)")
+    parser.add_argument("which", help="N oppure N:M (M escluso; come uno slice Python: 100:, :10, -10:)")
+    # "-10:" per argparse è un'opzione, non un numero: due argomenti sono sempre FILE e N:M
+    if len(argv) == 2 and not {"-h", "--help"} & set(argv):
+        argv = ["--", *argv]
+    args = parser.parse_args(argv)
+    try:
+        start, colon, stop = args.which.partition(":")
+        start = int(start) if start or not colon else None
+        stop = int(stop) if stop else None
+        with PromptReader(args.file) as reader:
+            if colon:
+                start, stop, _ = slice(start, stop).indices(len(reader))
+                prompts = reader.range(start, stop)
+            else:
+                prompts = [reader[start]]
+    except (OSError, ValueError, IndexError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 1
+    print(PROMPT_SEPARATOR.join(prompts))
+    return 0
+
+# --- Statistiche di esecuzione (--stats) ---
+
+class RunStats:
+    """
+    Wall time per stage and counters for one run. The pattern variants a run uses are tracked,
+    and placeholders and missing categories are counted from their use counters at the end,
+    instead of being counted (or printed) for every slot.
+    """
+
+    def __init__(self):
+        self.stages: dict[str, float] = {}
+        self.prompts = 0
+        self.bytes_written = 0
+        self.bytes_uncompressed = 0
+        self.encodings_tried: list[str] = []
+        # "memory cache", "binary cache", "json" o "themes" (fonte di ogni tema in themes)
+        self.dictionary_source = None
+        self.themes: dict[str, dict] = {}
+        # --cover: parole usate per categoria e prompt serviti per coprirle tutte
+        self.coverage: dict = None
+        # id(variante) -> (variante, usi al momento del tracking)
+        self._tracked = {}
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def track(self, variants: Iterable["_PatternVariant"]):
+        for v in variants:
+            if id(v) not in self._tracked:
+                self._tracked[id(v)] = (v, v.uses)
+
+    def usage(self) -> tuple[int, dict[str, int]]:
+        """(placeholders resolved, {missing category: hits}) since the variants were tracked."""
+        placeholders, missing = 0, collections.Counter()
+        for v, start in self._tracked.values():
+            n = v.uses - start
+            placeholders += n * len(v.tables)
+            for category in v.missing:
+                missing[category] += n
+        return placeholders, dict(missing)
+
+    def warn_missing(self):
+        for category, hits in self.usage()[1].items():
+            if hits:
+                print(f"⚠️ Categoria '{category}' non trovata o vuota! ({hits} placeholder rimossi)")
+
+    def to_dict(self) -> dict:
+        placeholders, missing = self.usage()
+        return {
+            "stages_sec": {k: round(v, 6) for k, v in self.stages.items()},
+            "prompts": self.prompts,
+            "placeholders_resolved": placeholders,
+            "missing_categories": missing,
+            "encodings_tried": self.encodings_tried,
+            "dictionary_source": self.dictionary_source,
+            "themes": self.themes,
+            "coverage": self.coverage,
+            "bytes_written": self.bytes_written,
+            "bytes_uncompressed": self.bytes_uncompressed,
+            "compression_ratio": round(self.bytes_uncompressed / self.bytes_written, 3) if self.bytes_written else None,
+            "write_mb_per_sec": round(self.bytes_uncompressed / self.stages["write"] / 1e6, 1) if self.stages.get("write") else None,
+        }
+
+    def report(self):
+        data = self.to_dict()
+        print("📊 Stats")
+        for name, seconds in data["stages_sec"].items():
+            print(f"   {name:<9} {seconds:>10.4f} s")
+        total = self.stages.get("total") or 0
+        rate = f" ({self.prompts / total:.0f} prompts/s)" if total else ""
+        print(f"   prompts: {self.prompts}{rate}, placeholders resolved: {data['placeholders_resolved']}")
+        print(f"   bytes written: {self.bytes_written}", end="")
+        if self.bytes_uncompressed != self.bytes_written:
+            print(f" ({self.bytes_uncompressed} uncompressed, ratio {data['compression_ratio']}x)", end="")
+        print(f", write throughput: {data['write_mb_per_sec'] or '-'} MB/s")
+        if self.dictionary_source == "themes":
+            print(f"   dictionary: {len(self.themes)} themes")
+            for name, theme in self.themes.items():
+                print(f"     {name:<16} {theme['source']}, {theme['categories']} categories, ratio {theme['ratio']:g}")
+        elif self.dictionary_source == "json":
+            print(f"   dictionary: json, encodings tried: {', '.join(self.encodings_tried) or '-'}")
+        else:
+            print(f"   dictionary: {self.dictionary_source}, no JSON read")
+        if self.coverage is not None:
+            cover = self.coverage
+            print(f"   coverage: {cover['covered']}/{cover['words']} words, "
+                  f"covered after {cover['prompts_to_cover'] if cover['prompts_to_cover'] is not None else '-'} prompts")
+        for category, hits in data["missing_categories"].items():
+            print(f"   missing '{category}': {hits}")
+
+# --- Generazione prompt ---
+
+def generate_random(parts: dict[str, list[str]], n: int) -> list[str]:
+    """
+    Genera n prompt random, ciascuno lungo tra 10 e 20 parole, scegliendo parole casuali dalle categorie disponibili.
+    """
+    prompts = []
+    # Le liste una volta sola: nel ciclo nessuna ricerca per nome di categoria
+    tables = list(parts.values())
+    for _ in range(n):
+        length = random.randint(10, 20)
+        prompt = " ".join(random.choice(random.choice(tables)) for _ in range(length))
+        prompts.append(prompt)
+    return prompts
+
+def generate_combinatorial(parts: dict[str, list[str]]) -> Iterator[str]:
+    """Every combination of one word per category, produced lazily (the product is huge)."""
+    combos = itertools.product(*(parts[k] for k in parts))
+    return (" ".join(c) for c in combos)
+
+def parse_args():
+    import argparse
+    parser = argparse.ArgumentParser(description="Generatore di prompt combinatori, casuali o custom da file JSON.")
+    parser.add_argument("-i", "--input", nargs="+", default="prompt_parts.json", help="File JSON di input (più file o cartelle: temi uniti in un dizionario)")
+    parser.add_argument("--mix", nargs="+", metavar="THEME=RATIO", type=parse_mix, help="Quota di estrazioni per tema nelle categorie condivise (es. fantasy=3 scifi=1)")
+    parser.add_argument("-o", "--output", default="invoke_prompts.txt", help="File di output (una cartella: prossimo invoke_prompts_NNN libero)")
+    parser.add_argument("-m", "--mode", choices=["ran", "comb", "both"], default="ran", help="Modalità di generazione")
+    parser.add_argument("-n", "--num-prompts", type=int, default=10, help="Numero di prompt da generare")
+    parser.add_argument("-c", "--comma", type=str, help="Virgola")
+    parser.add_argument("-art", "--articles", type=str, help="Articoli da usare nei prompt")
+    parser.add_argument("-adj", "--adjectives", type=str, help="Aggettivi da usare nei prompt")
+    parser.add_argument("-noun", "--nouns", type=str, help="Sostantivi da usare nei prompt")
+    parser.add_argument("-prep", "--prepositions", type=str, help="Preposizioni da usare nei prompt")
+    parser.add_argument("-pron", "--pronouns", type=str, help="Pronomi da usare nei prompt")
+    parser.add_argument("-conj", "--conjunctions", type=str, help="Congiunzioni da usare nei prompt")
+    parser.add_argument("-verb", "--verbs", type=str, help="Verbi da usare nei prompt")
+    parser.add_argument("-adv", "--adverbs", type=str, help="Avverbi da usare nei prompt")
+    parser.add_argument("-sty", "--styles", type=str, help="Stili da usare nei prompt")
+    parser.add_argument("-light", "--dramatic-lighting", type=str, help="Illuminazione drammatica da usare nei prompt")
+    parser.add_argument("-tones", "--color-tones", type=str, help="Toni di colore da usare nei prompt")
+    # Rimosso --custom-order perché la modalità custom non è più supportata
+    parser.add_argument("--long", "--long-forms", action="store_true", help="Usa forme lunghe dei prompt")
+    parser.add_argument("--short", "--short-forms", action="store_true", help="Usa forme corte dei prompt")
+    parser.add_argument("--offset", type=int, default=0, help="Modalità comb: primo indice dello spazio combinatorio da generare")
+    parser.add_argument("--limit", type=int, help="Modalità comb: quanti prompt generare dall'offset (default: --num-prompts)")
+    parser.add_argument("--count", action="store_true", help="Stampa la dimensione esatta dello spazio combinatorio ed esce")
+    parser.add_argument("--seed", type=int, help="Seed per un output riproducibile (identico con qualsiasi --workers)")
+    parser.add_argument("--workers", type=int, default=1, help="Numero di processi per la generazione random")
+    parser.add_argument("--unique", action="store_true", help="Nessun prompt ripetuto (fino al numero di prompt distinti possibili)")
+    parser.add_argument("--allow-missing", action="store_true", help="Genera anche se alcuni placeholder non hanno una categoria (vengono tolti dai prompt)")
+    parser.add_argument("--cover", action="store_true", help="Usa ogni parola di ogni categoria almeno una volta nel minor numero di prompt, poi continua a caso")
+    parser.add_argument("--stats", action="store_true", help="Stampa tempi per fase e contatori della generazione")
+    parser.add_argument("--stats-json", metavar="PATH", help="Salva le statistiche della generazione in un file JSON")
+    parser.add_argument("--engine", choices=["python", "numpy"], default="python", help="Motore per la generazione random (numpy: a blocchi, se installato)")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="txt", help="Formato di output: testo con separatori o una riga JSON per prompt")
+    parser.add_argument("--compress", choices=list(COMPRESSION_SUFFIXES), default="none", help="Compressione a blocchi dell'output (con indice .idx)")
+    parser.add_argument("--compress-level", type=int, help="Livello gzip (1-9, default 6) o preset xz (0-9, default 3)")
+    parser.add_argument("--max-prompts-per-file", type=int, help="Divide l'output in più file con al massimo N prompt ciascuno")
+    parser.add_argument("--max-bytes-per-file", metavar="SIZE", type=parse_size, help="Divide l'output in file di al massimo SIZE byte di testo (es. 500M)")
+    parser.add_argument("--index", action="store_true", help="Scrive l'indice .idx anche per l'output di testo non compresso")
+    parser.add_argument("--checkpoint-every", type=int, metavar="N", help="Salva un checkpoint (output.ckpt) ogni N prompt, per riprendere con --resume")
+    parser.add_argument("--resume", action="store_true", help="Riprende dall'ultimo checkpoint di -o un run interrotto (stesse opzioni)")
+
+    args = parser.parse_args()
+    if args.compress_level is not None and args.compress in COMPRESS_LEVEL_RANGES:
+        low, high = COMPRESS_LEVEL_RANGES[args.compress]
+        if not low <= args.compress_level <= high:
+            parser.error(f"--compress-level for {args.compress} must be between {low} and {high}")
+    if args.max_prompts_per_file is not None and args.max_prompts_per_file < 1:
+        parser.error("--max-prompts-per-file must be at least 1")
+    return args
+
+# --- NUOVE FUNZIONI PER GRAMMATICA ---
+_PLACEHOLDER_RE = re.compile(r"\{(\w+)\}")
+_WHITESPACE_RE = re.compile(r"\s+")
+_NUMBER_SUFFIX_RE = re.compile(r"_(singular|plural)$")
+# Categorie che seguono la scelta singolare/plurale fatta una volta per prompt
+_PLURAL_AWARE = ("Nouns", "Verbs")
+
+
+def _resolve_category(parts: dict[str, list[str]], category: str, use_plural: bool):
+    """
+    Returns the word list a placeholder resolves to, or None if it is missing.
+    Same lookup rules as the old per-slot get_word: Nouns/Verbs follow the plural choice,
+    then the exact key, then the base category without _singular/_plural.
+    """
+    if category in _PLURAL_AWARE:
+        key = f"{category}_plural" if use_plural else f"{category}_singular"
+    else:
+        key = category
+    words = parts.get(key)
+    if isinstance(words, list) and words:
+        return words
+    words = parts.get(_NUMBER_SUFFIX_RE.sub("", key))
+    if isinstance(words, list) and words:
+        return words
+    return None
+
+
+def _is_clean(words: list[str]) -> bool:
+    """True if no word can introduce empty slots or extra whitespace in the final prompt."""
+    return all(isinstance(w, str) and w and " ".join(w.split()) == w for w in words)
+
+
+# Analisi grammaticale fatta al caricamento: stesse regole di apply_grammar_rules, risolte
+# una volta per parola e per pattern invece che con quattro regex su ogni prompt
+_VOWEL_START_RE = re.compile(r"[aeiouAEIOU]", re.IGNORECASE)      # "a" -> "an"
+_CONSONANT_START_RE = re.compile(r"[^aeiouAEIOU]")                 # "an" -> "a"
+_WORD_CHAR_RE = re.compile(r"\w")
+# Token che una regola può correggere quando è seguito da uno spazio e dalla parola dello slot
+_LEFT_TOKEN_RE = re.compile(r"\b(a|A|an|he|she|it|this|that|they|we|you|these|those) \Z")
+_END_TOKEN_RE = re.compile(r"\b(?:a|A|an|he|she|it|this|that|they|we|you|these|those)\Z")
+_SINGULAR_PRONOUNS = ("he", "she", "it", "this", "that")
+
+
+class WordGrammar:
+    """
+    Grammar facts about one word list, computed once when the dictionary is loaded:
+    per-word vowel/consonant flags for the a/an rules, and whether any word could take part in
+    a correction on its own or through its last word (then the pattern uses the regex fallback).
+    """
+    __slots__ = ("words", "clean", "inert", "ends_with_token", "vowel", "consonant", "_variants")
+
+    def __init__(self, words: list[str]):
+        self.words = words
+        self.clean = _is_clean(words)
+        self.inert = all(isinstance(w, str) and apply_grammar_rules(w) == w for w in words)
+        self.ends_with_token = self.inert and any(_END_TOKEN_RE.search(w) for w in words)
+        self.vowel = [bool(self.inert and _VOWEL_START_RE.match(w)) for w in words]
+        self.consonant = [bool(self.inert and _CONSONANT_START_RE.match(w)) for w in words]
+        self._variants = {}
+
+    def after(self, token: str) -> list[str]:
+        """
+        The words as they read after "<token> ", with the correction already applied:
+        the article is folded into the word ("an owl", "a dog"), verbs agree with the pronoun.
+        Same length and order as words, so random draws are unchanged.
+        """
+        if token not in self._variants:
+            if token in ("a", "A"):
+                words = [("an " if v else token + " ") + w for w, v in zip(self.words, self.vowel)]
+            elif token == "an":
+                words = [("a " if c else "an ") + w for w, c in zip(self.words, self.consonant)]
+            elif token in _SINGULAR_PRONOUNS:
+                words = [re.sub(r"\A(are|have)\b", r"\1s", w) for w in self.words]
+            else:
+                words = [re.sub(r"\A(is|has)\b", "are", w) for w in self.words]
+            if words == self.words:
+                words = self.words
+            elif isinstance(self.words, WeightedWords):
+                words = self.words.with_words(words)
+            self._variants[token] = words
+        return self._variants[token]
+
+
+def analyse_parts(parts: dict[str, list[str]]) -> dict[int, WordGrammar]:
+    """WordGrammar for every word list of parts, keyed by id() of the list."""
+    grammar = {}
+    for words in parts.values():
+        if isinstance(words, list) and id(words) not in grammar:
+            grammar[id(words)] = WordGrammar(words)
+    return grammar
+
+
+def _word_grammar(grammar: dict[int, WordGrammar], words: list[str]) -> WordGrammar:
+    info = grammar.get(id(words))
+    if info is None or info.words is not words:
+        info = grammar[id(words)] = WordGrammar(words)
+    return info
+
+
+def _resolve_grammar(literals: list[str], tables: list[list[str]], grammar: dict[int, WordGrammar]) -> bool:
+    """
+    Applies the grammar rules to a compiled variant ahead of time, editing literals and tables in
+    place. Returns False, leaving them untouched, when a correction could depend on more than
+    "fixed literal + the word picked for the next slot"; the variant then keeps the regex pass.
+    """
+    infos = [_word_grammar(grammar, t) for t in tables]
+    if not all(info.inert for info in infos):
+        return False
+    if any(apply_grammar_rules(lit) != lit for lit in literals):
+        return False
+    last = len(tables) - 1
+    for j, info in enumerate(infos):
+        left, right = literals[j], literals[j + 1]
+        # Slot delimitati da spazi o punteggiatura: niente parole attaccate a letterali o ad altri slot
+        if (left and _WORD_CHAR_RE.match(left[-1])) or (not left and j > 0):
+            return False
+        if (right and _WORD_CHAR_RE.match(right[0])) or (not right and j < last):
+            return False
+        # "... it" + " are": la correzione dipenderebbe dalla parola a sinistra, caso non gestito
+        if info.ends_with_token and right.startswith(" "):
+            return False
+
+    for j, info in enumerate(infos):
+        match = _LEFT_TOKEN_RE.search(literals[j])
+        if not match:
+            continue
+        token = match[1]
+        if token in ("a", "A", "an"):
+            # L'articolo passa dal letterale alla parola, già nella forma giusta
+            literals[j] = literals[j][:match.start()]
+        tables[j] = info.after(token)
+    return True
+
+
+class _PatternVariant:
+    """
+    One pattern resolved for a fixed singular/plural choice: literal segments interleaved with
+    the word lists of the slots. Missing categories are dropped here, once, instead of per prompt.
+    """
+    __slots__ = ("tables", "missing", "layout", "needs_cleanup", "grammar_fallback", "weighted", "uses")
+
+    def __init__(self, template: str, parts: dict[str, list[str]], use_plural: bool,
+                 grammar: dict[int, WordGrammar] = None):
+        literals, tables, missing = [], [], []
+        pending, pos = "", 0
+        for match in _PLACEHOLDER_RE.finditer(template):
+            pending += template[pos:match.start()]
+            pos = match.end()
+            words = _resolve_category(parts, match[1], use_plural)
+            if words is None:
+                missing.append(match[1])
+                continue
+            literals.append(pending)
+            tables.append(words)
+            pending = ""
+        literals.append(pending + template[pos:])
+
+        # Same cleanup as re.sub(r'\s+', ' ', phrase).strip(), done on the literals only
+        literals = [_WHITESPACE_RE.sub(" ", lit) for lit in literals]
+        literals[0] = literals[0].lstrip()
+        literals[-1] = literals[-1].rstrip()
+
+        if grammar is None:
+            # Compilazione usa e getta (generate_grammatical_phrase): nessuna analisi delle liste,
+            # che costerebbe più del prompt stesso; pulizia e regex sul risultato come prima
+            self.needs_cleanup = True
+            self.grammar_fallback = True
+        else:
+            # Words with odd whitespace still need the final cleanup to match the old output
+            self.needs_cleanup = not all(_word_grammar(grammar, t).clean for t in tables)
+            # Grammatica risolta qui se possibile, altrimenti regex sul prompt finito
+            self.grammar_fallback = self.needs_cleanup or not _resolve_grammar(literals, tables, grammar)
+
+        self.tables = tables
+        self.weighted = any(isinstance(t, WeightedWords) for t in tables)
+        self.missing = tuple(missing)
+        # Literals at even positions, words go in the odd ones
+        self.layout = [None] * (2 * len(literals) - 1)
+        self.layout[0::2] = literals
+        # Prompt generati con questa variante: placeholder e categorie mancanti si contano da qui
+        self.uses = 0
+
+    def to_state(self, table) -> tuple:
+        """Plain tuple for the binary cache; table(words) gives the pool index of a word list."""
+        return (self.layout[0::2], [table(t) for t in self.tables], self.missing,
+                self.needs_cleanup, self.grammar_fallback)
+
+    @classmethod
+    def from_state(cls, state: tuple, tables: list[list[str]]) -> "_PatternVariant":
+        literals, table_ids, missing, needs_cleanup, grammar_fallback = state
+        variant = cls.__new__(cls)
+        variant.tables = [tables[i] for i in table_ids]
+        variant.weighted = any(isinstance(t, WeightedWords) for t in variant.tables)
+        variant.missing = tuple(missing)
+        variant.needs_cleanup = needs_cleanup
+        variant.grammar_fallback = grammar_fallback
+        variant.layout = [None] * (2 * len(literals) - 1)
+        variant.layout[0::2] = literals
+        variant.uses = 0
+        return variant
+
+    def _finish(self, phrase: str) -> str:
+        """Cleanup and regex grammar pass, only for variants the analysis could not resolve."""
+        if self.needs_cleanup:
+            phrase = " ".join(phrase.split())
+        return apply_grammar_rules(phrase)
+
+    def render(self, rng=random) -> str:
+        self.uses += 1
+        buf = self.layout.copy()
+        if self.weighted:
+            buf[1::2] = [t[d] for t, d in zip(self.tables, self.draw_digits(rng))]
+        else:
+            choice = rng.choice
+            buf[1::2] = [choice(t) for t in self.tables]
+        phrase = "".join(buf)
+        return self._finish(phrase) if self.grammar_fallback else phrase
+
+    def draw_digits(self, rng=random) -> list[int]:
+        """
+        Random word indices for one prompt, drawing the same numbers render() would: alias draws
+        for weighted lists, randrange (same as choice) for the others.
+        """
+        randrange = rng.randrange
+        return [randrange(len(t)) if type(t) is list else t.draw_index(rng) for t in self.tables]
+
+    def size(self) -> int:
+        """Number of distinct word combinations of this variant."""
+        n = 1
+        for t in self.tables:
+            n *= len(t)
+        return n
+
+    def digits(self, index: int) -> list[int]:
+        """Mixed-radix digits of index, last slot varying fastest (itertools.product order)."""
+        digits = [0] * len(self.tables)
+        for j in range(len(self.tables) - 1, -1, -1):
+            index, digits[j] = divmod(index, len(self.tables[j]))
+        return digits
+
+    def render_digits(self, digits: list[int]) -> str:
+        self.uses += 1
+        return self.text(digits)
+
+    def text(self, digits) -> str:
+        """The prompt for these word indices, without counting a use (extra trailing digits are ignored)."""
+        buf = self.layout.copy()
+        buf[1::2] = [t[d] for t, d in zip(self.tables, digits)]
+        phrase = "".join(buf)
+        return self._finish(phrase) if self.grammar_fallback else phrase
+
+    def iter_range(self, start: int, stop: int) -> Iterator[str]:
+        """Renders combinations start..stop-1 in order, stepping the digits like an odometer."""
+        tables = self.tables
+        digits = self.digits(start)
+        buf = self.layout.copy()
+        buf[1::2] = [t[d] for t, d in zip(tables, digits)]
+        last = len(tables) - 1
+        for _ in range(stop - start):
+            self.uses += 1
+            phrase = "".join(buf)
+            yield self._finish(phrase) if self.grammar_fallback else phrase
+            # Incrementa l'ultima cifra e propaga il riporto, aggiornando solo le parole cambiate
+            j = last
+            while j >= 0:
+                digits[j] += 1
+                if digits[j] < len(tables[j]):
+                    buf[2 * j + 1] = tables[j][digits[j]]
+                    break
+                digits[j] = 0
+                buf[2 * j + 1] = tables[j][0]
+                j -= 1
+
+
+class CompiledPattern:
+    """
+    A pattern parsed once at load time. Rendering draws the same random numbers, in the same
+    order, as the old placeholder-by-placeholder substitution, and returns the prompt with the
+    grammar rules already applied (same text as apply_grammar_rules on the old output).
+    """
+    __slots__ = ("source", "variants")
+
+    def __init__(self, template: str, parts: dict[str, list[str]], grammar: dict[int, WordGrammar] = None):
+        """grammar: see analyse_parts; None compiles a one-off pattern without analysing the word lists."""
+        self.source = template
+        plural = _PatternVariant(template, parts, True, grammar)
+        singular = plural
+        if any(m[1] in _PLURAL_AWARE for m in _PLACEHOLDER_RE.finditer(template)):
+            singular = _PatternVariant(template, parts, False, grammar)
+            # Nouns/Verbs che ricadono sulla stessa lista: le due varianti darebbero gli stessi prompt
+            if (singular.layout == plural.layout and singular.tables == plural.tables
+                    and [getattr(t, "weights", None) for t in singular.tables]
+                    == [getattr(t, "weights", None) for t in plural.tables]
+                    and singular.grammar_fallback == plural.grammar_fallback):
+                singular = plural
+        # Same order as random.choice([True, False])
+        self.variants = (plural, singular)
+
+    def to_state(self, table) -> tuple:
+        """(source, plural variant, singular variant or None if it is the same object)."""
+        plural, singular = self.variants
+        return (self.source, plural.to_state(table), None if singular is plural else singular.to_state(table))
+
+    @classmethod
+    def from_state(cls, state: tuple, tables: list[list[str]]) -> "CompiledPattern":
+        source, plural, singular = state
+        pattern = cls.__new__(cls)
+        pattern.source = source
+        plural = _PatternVariant.from_state(plural, tables)
+        pattern.variants = (plural, plural if singular is None else _PatternVariant.from_state(singular, tables))
+        return pattern
+
+    def render(self, rng=random) -> str:
+        return self.variants[rng.randrange(2)].render(rng)
+
+    def distinct_variants(self) -> tuple:
+        """The variants that give different prompts: just one if the pattern has no Nouns/Verbs."""
+        plural, singular = self.variants
+        return (plural,) if singular is plural else (plural, singular)
+
+    def size(self) -> int:
+        """Exact number of distinct prompts this pattern can produce."""
+        return sum(v.size() for v in self.distinct_variants())
+
+
+def pattern_variants(patterns: Iterable[CompiledPattern]) -> list[_PatternVariant]:
+    """The distinct variants of a list of patterns, in a fixed order."""
+    return [v for p in patterns for v in p.distinct_variants()]
+
+
+def compile_patterns(patterns: list[str], parts: dict[str, list[str]],
+                     grammar: dict[int, WordGrammar] = None) -> list[CompiledPattern]:
+    """Compiles a list of patterns against the loaded parts (grammar: see analyse_parts)."""
+    if grammar is None:
+        grammar = {}
+    # Le voci che non sono stringhe sono segnalate da pattern_problems, non compilate
+    return [CompiledPattern(p, parts, grammar) for p in patterns if isinstance(p, str)]
+
+
+# Graffe rimaste dopo aver tolto i placeholder validi: "{Adj", "{Light Tones}", "{}"
+_STRAY_BRACE_RE = re.compile(r"[{}]")
+
+def pattern_problems(key: str, sources: list, compiled: list[CompiledPattern], empty: Iterable[str] = ()) -> list[str]:
+    """
+    Checks the placeholders of a pattern list once, on its compiled form: every {Category} of
+    every pattern must have resolved to a word list (Nouns/Verbs to one in the singular and in
+    the plural variant), with the same fallbacks the rendering uses. Returns one line per bad
+    pattern, naming each placeholder that did not resolve and why; [] if there is none.
+    sources: the patterns as in the file (entries that are not strings are reported too).
+    """
+    empty = set(empty)
+    problems = []
+    compiled = iter(compiled)
+    for i, source in enumerate(sources):
+        if not isinstance(source, str):
+            problems.append(f"{key}[{i}] {source!r}: not a string")
+            continue
+        pattern = next(compiled)
+        issues = []
+        if _STRAY_BRACE_RE.search(_PLACEHOLDER_RE.sub("", source)):
+            issues.append("malformed placeholder (use {Name}, letters, digits and _ only)")
+        plural, singular = pattern.variants
+        for category in dict.fromkeys(plural.missing + singular.missing):
+            forms = [f"{category}_{form}" for form, v in (("plural", plural), ("singular", singular))
+                     if category in v.missing]
+            state = "empty" if empty & {category, *forms} else "not found"
+            if category in _PLURAL_AWARE and len(forms) == 1:
+                issues.append(f"{{{category}}}: {forms[0]} {state}")
+            else:
+                issues.append(f"{{{category}}} {state}")
+        if issues:
+            problems.append(f'{key}[{i}] "{source}": {"; ".join(issues)}')
+    return problems
+
+def check_patterns(dictionary: LoadedDictionary, keys: Iterable[str]):
+    """
+    Fails fast, before generating, if a pattern of keys has a placeholder that does not resolve:
+    ValueError with the report of every bad pattern (and the empty categories of the file).
+    Empty categories no pattern uses are only a warning.
+    """
+    if not dictionary.parts:
+        raise ValueError(f"❌ {dictionary.path}: nessuna categoria (dizionario mancante, illeggibile o vuoto).")
+    problems = [line for key in keys for line in dictionary.problems(key)]
+    if problems:
+        report = "\n".join(f"   {line}" for line in problems)
+        if dictionary.empty:
+            report += f"\n   empty categories: {', '.join(dictionary.empty)}"
+        raise ValueError(f"❌ {len(problems)} pattern non risolvibili in {dictionary.path}:\n{report}\n"
+                         f"   (--allow-missing genera comunque, togliendo quei placeholder)")
+    if dictionary.empty:
+        print(f"⚠️ Categorie vuote nel dizionario: {', '.join(dictionary.empty)}")
+
+def warn_problems(dictionary: LoadedDictionary):
+    """The report of check_patterns for all the patterns, printed as warnings (compile, serve --preload)."""
+    problems = [line for key in dictionary.patterns for line in dictionary.problems(key)]
+    for line in problems:
+        print(f"⚠️ {line}")
+    if dictionary.empty:
+        print(f"⚠️ Categorie vuote nel dizionario: {', '.join(dictionary.empty)}")
+
+def generate_grammatical_phrase(parts: dict[str, list[str]], template: str) -> str:
+    """
+    Genera una frase basata su un template grammaticale, scegliendo singolare o plurale coerente.
+    Sostituisce tutti i placeholder {Categoria} con una parola casuale dalla categoria corrispondente.
+    Se una categoria non esiste, rimuove il placeholder.
+    The grammar rules are already applied to the result.
+    For repeated generation compile the pattern once with CompiledPattern and call render().
+    """
+    pattern = CompiledPattern(template, parts)
+    phrase = pattern.render()
+    for variant in pattern.distinct_variants():
+        if variant.uses:
+            for category in variant.missing:
+                print(f"⚠️ Categoria '{category}' non trovata o vuota!")
+    return phrase
+
+def apply_grammar_rules(phrase: str) -> str:
+    """
+    Applica correzioni grammaticali automatiche.
+    Compiled patterns resolve these rules ahead of time; this regex pass is the fallback for
+    patterns the analysis in _resolve_grammar cannot handle.
+    """
+    # Accordi articolo-sostantivo
+    phrase = re.sub(r"\ba ([aeiouAEIOUaeiou])", r"an \1", phrase, flags=re.IGNORECASE)
+    phrase = re.sub(r"\ban ([^aeiouAEIOU])", r"a \1", phrase)
+    
+    # Accordi verbo-soggetto
+    phrase = re.sub(r"\b(he|she|it|this|that) (are|have)\b", r"\1 \2s", phrase)
+    phrase = re.sub(r"\b(they|we|you|these|those) (is|has)\b", r"\1 are", phrase)
+    
+    # Forme verbali contraffe
+    # phrase = phrase.replace(" is ", "'s ").replace(" are ", "'re ")
+    
+    return phrase
+# --- Main ---
+
+def use_every_category(args):
+    # Se non specificato, usa tutte le categorie almeno una volta in ordine standard
+    result = []
+    if args.articles:
+        result.append("art")
+    if args.adjectives:
+        result.append("adj")
+    if args.pronouns:
+        result.append("pron")
+    if args.nouns:
+        result.append("noun")
+    if args.prepositions:
+        result.append("prep")
+    if args.adverbs:
+        result.append("adv")
+    if args.verbs:
+        result.append("verb")
+    if args.conjunctions:
+        result.append("conj")
+    if args.styles:
+        result.append("sty")
+    if args.dramatic_lighting:
+        result.append("light")
+    if args.color_tones:
+        result.append("tones")
+        
+    if not result:
+        result = ["pron", "noun", "conj", "art", "adj", "verb", "adv", "adj", "conj", "adj", ";", "sty", "light", "tones"]
+
+    return result
+
+def main(args=None):
+    if args is None:
+        if sys.argv[1:2] == ["compile"]:
+            sys.exit(compile_command(sys.argv[2:]))
+        if sys.argv[1:2] == ["serve"]:
+            sys.exit(serve_command(sys.argv[2:]))
+        if sys.argv[1:2] == ["read"]:
+            sys.exit(read_command(sys.argv[2:]))
+        args = parse_args()
+    
+    # Controllo aggiuntivo per prevenire errori
+    if not hasattr(args, 'custom_order'):
+        args.custom_order = None
+    if not hasattr(args, 'short'):
+        args.short = False
+    if not hasattr(args, 'long'):
+        args.long = False
+
+    stats = RunStats()
+    run_start = time.perf_counter()
+
+    # Carica il dizionario (parti, alias Nouns/Verbs e pattern) una volta sola, poi dalla cache
+    with stats.stage("load"):
+        dictionary = load_input(args.input, stats, dict(getattr(args, "mix", None) or {}))
+    parts = dictionary.parts
+
+    if getattr(args, "count", False):
+        space = combinatorial_space(args, parts, dictionary)
+        print(f"🔢 Combinatorial space: {space.total} distinct prompts")
+        return
+
+    # Con --seed o --workers la parte random è divisa in shard riproducibili
+    seed = getattr(args, "seed", None)
+    workers = getattr(args, "workers", 1) or 1
+
+    engine = getattr(args, "engine", "python") or "python"
+    if engine == "numpy" and _import_numpy() is None:
+        print("⚠️ NumPy non installato: uso il motore Python.")
+        engine = "python"
+
+    fmt = getattr(args, "format", "txt") or "txt"
+    compression = getattr(args, "compress", "none") or "none"
+    options = dict(fmt=fmt, compression=compression, index=getattr(args, "index", False),
+                   level=getattr(args, "compress_level", None))
+    max_prompts = getattr(args, "max_prompts_per_file", None)
+    max_bytes = getattr(args, "max_bytes_per_file", None)
+    # Controllati prima di riservare il nome di output: 0 non vuol dire "nessun limite"
+    if max_prompts is not None and max_prompts < 1:
+        raise ValueError("❌ --max-prompts-per-file deve essere >= 1.")
+    if max_bytes is not None and max_bytes < 1:
+        raise ValueError("❌ --max-bytes-per-file deve essere >= 1.")
+    rotating = max_prompts is not None or max_bytes is not None
+
+    # Checkpoint: il run riparte dall'ultimo blocco salvato, con lo stesso seed
+    every = getattr(args, "checkpoint_every", None)
+    resume = getattr(args, "resume", False)
+    saved = None
+    if every is not None or resume:
+        if getattr(args, "unique", False) or getattr(args, "cover", False):
+            raise ValueError("❌ --checkpoint-every e --resume non si possono usare con --unique o --cover.")
+        if rotating:
+            raise ValueError("❌ --checkpoint-every e --resume non si possono usare con l'output a rotazione.")
+        if every is not None and every < 1:
+            raise ValueError("❌ --checkpoint-every deve essere >= 1.")
+    if resume:
+        if os.path.isdir(args.output):
+            raise ValueError("❌ --resume: indica il file di output del run da riprendere, non la cartella.")
+        saved = read_checkpoint(output_filename(args.output, compression))
+        if seed is None:
+            seed = saved["run"]["seed"]
+        every = every or saved["every"]
+    if seed is None and (workers > 1 or (every and args.mode != "comb")):
+        seed = random.SystemRandom().randrange(2 ** 63)
+        print(f"🎲 Seed: {seed} (use --seed {seed} to reproduce this run)")
+
+    # --- Custom prompt order parsing ---
+    stage_start = time.perf_counter()
+    blocks = generation_blocks(args, dictionary, stats, seed, workers, engine, saved["prompts"] if saved else 0)
+    stats.stages["compile"] = time.perf_counter() - stage_start
+
+    # Generazione e scrittura sono intrecciate: il tempo di scrittura è misurato a parte
+    stage_start = time.perf_counter()
+    output, reserved = args.output, None
+    if os.path.isdir(output):
+        # Cartella di output: prossimo nome libero, riservato subito (run paralleli nella stessa cartella)
+        output = reserved = get_next_output_filename(outdir=output, ext=output_filename(f".{fmt}", compression))
+    output = output_filename(output, compression)
+    checkpoint = None
+    if every:
+        checkpoint = Checkpoint(output, checkpoint_run(args, seed, engine, options), every, saved)
+        if saved:
+            print(f"⏩ Resuming {output} after {checkpoint.prompts} prompts ({checkpoint.bytes} bytes).")
+    if rotating:
+        try:
+            write_rotating(blocks, output, stats, max_prompts, max_bytes, **options)
+        finally:
+            # Il numero resta occupato dalle parti (o è libero se il run è fallito)
+            if reserved:
+                release_output_filename(reserved)
+    else:
+        try:
+            write_prompt_blocks(blocks, output, stats, checkpoint=checkpoint, **options)
+        except KeyboardInterrupt:
+            if checkpoint is None or not checkpoint.prompts:
+                raise
+            print(f"\n⏸️ Interrupted: {checkpoint.prompts} prompts saved in {output}. To continue:\n   {checkpoint.command()}")
+            sys.exit(130)
+        except Exception:
+            if reserved:
+                release_output_filename(reserved)
+            # L'errore arriva al chiamante (exit 1): il checkpoint resta per riprendere
+            if checkpoint is not None and checkpoint.prompts:
+                print(f"\n❌ Run failed: {checkpoint.prompts} prompts saved in {output}. Once fixed, continue with:\n"
+                      f"   {checkpoint.command()}", file=sys.stderr)
+            raise
+    stats.stages["generate"] = time.perf_counter() - stage_start - stats.stages.get("write", 0.0)
+    stats.stages["total"] = time.perf_counter() - run_start
+
+    # Un solo riepilogo per le categorie mancanti, non un avviso per ogni placeholder
+    stats.warn_missing()
+    if getattr(args, "stats", False):
+        stats.report()
+    stats_json = getattr(args, "stats_json", None)
+    if stats_json:
+        import json
+        with open(stats_json, "w", encoding="utf-8") as f:
+            json.dump(stats.to_dict(), f, indent=2)
+
+def generation_blocks(args, dictionary: LoadedDictionary, stats: RunStats, seed: int = None,
+                      workers: int = 1, engine: str = "python", start: int = 0) -> Iterator[tuple[str, int]]:
+    """
+    The prompt blocks of a run for args.mode, ready for write_prompt_blocks. Patterns are
+    chosen and checked here (ValueError before anything is generated); the prompts themselves
+    are produced lazily while the blocks are consumed.
+    start: skip the first start prompts of the run (a checkpoint: a block boundary of a seeded run).
+    """
+    parts = dictionary.parts
+
+    def random_blocks(num_prompts, start=0):
+        plan = pattern_plan(args, parts, dictionary, num_prompts)
+        stats.track(pattern_variants(p for patterns, _ in plan for p in patterns))
+        if getattr(args, "cover", False):
+            if getattr(args, "unique", False):
+                raise ValueError("❌ --cover e --unique non si possono usare insieme.")
+            if workers > 1 or engine != "python":
+                print("⚠️ --cover runs in a single process with the Python engine.")
+            return chunk_prompts(iter_cover(plan, parts, seed, stats))
+        if getattr(args, "unique", False):
+            if workers > 1 or engine != "python":
+                print("⚠️ --unique runs in a single process with the Python engine.")
+            return chunk_prompts(iter_unique(plan, parts, seed, stats))
+        if seed is not None:
+            return iter_seeded_blocks(plan, seed, workers, engine, start)
+        if start:
+            raise ValueError("❌ Solo i run con un seed possono ripartire da metà.")
+        if engine == "numpy":
+            return iter_batch_blocks(plan)
+        return chunk_prompts(iter_plan(plan))
+
+    if args.mode == "ran":
+        return random_blocks(args.num_prompts, start)
+    if args.mode == "comb":
+        return chunk_prompts(iter_combinatorial(args, parts, dictionary, stats=stats, start=start))
+    if args.mode == "both":
+        # Circa metà random e metà combinatori
+        comb_count = args.num_prompts // 2
+        random_count = args.num_prompts - comb_count
+        return itertools.chain(
+            random_blocks(random_count, min(start, random_count)),
+            chunk_prompts(iter_combinatorial(args, parts, dictionary, comb_count, stats, max(start - random_count, 0))),
+        )
+    # fallback: random
+    return chunk_prompts(generate_random(parts, args.num_prompts))
+
+def pattern_plan(args, parts, dictionary: LoadedDictionary = None,
+                 num_prompts: int = None) -> list[tuple[list[CompiledPattern], int]]:
+    """
+    Decides which compiled patterns to use and how many prompts to draw from each group,
+    in output order: [(patterns, count), ...]. Raises ValueError before anything is generated.
+    num_prompts overrides args.num_prompts.
+    """
+    if num_prompts is None:
+        num_prompts = args.num_prompts
+    # Carica i patterns (dalla cache se il file non è cambiato)
+    if dictionary is None:
+        dictionary = load_input(args.input, mix=dict(getattr(args, "mix", None) or {}))
+    # Compila i pattern una volta sola, non a ogni prompt
+    if parts is dictionary.parts:
+        patterns_short = dictionary.compiled("Patterns_short")
+        patterns_long = dictionary.compiled("Patterns_long")
+    else:
+        patterns_short = compile_patterns(dictionary.patterns["Patterns_short"], parts)
+        patterns_long = compile_patterns(dictionary.patterns["Patterns_long"], parts)
+
+    plan = []
+    use_short = getattr(args, "short", False)
+    use_long = getattr(args, "long", False)
+
+    if (use_short and use_long) or (not use_short and not use_long):
+        half = num_prompts // 2
+        if not patterns_short and not patterns_long:
+            raise ValueError("❌ Nessun pattern corto o lungo trovato nel file JSON. Controlla il file e riprova.")
+        if patterns_short:
+            plan.append((patterns_short, half))
+        if patterns_long:
+            plan.append((patterns_long, num_prompts - half))
+    elif use_short and patterns_short:
+        plan.append((patterns_short, num_prompts))
+    elif use_long and patterns_long:
+        plan.append((patterns_long, num_prompts))
+    elif use_long:
+        raise ValueError("❌ Nessun pattern lungo trovato nel file JSON. Controlla il file e riprova.")
+    else:
+        raise ValueError("❌ Nessun pattern corto trovato nel file JSON. Controlla il file e riprova.")
+    # Placeholder controllati una volta sul dizionario, non a ogni prompt: errore prima di generare
+    if parts is dictionary.parts and not getattr(args, "allow_missing", False):
+        check_patterns(dictionary, [key for key, patterns in (("Patterns_short", patterns_short), ("Patterns_long", patterns_long))
+                                    if any(group is patterns for group, _ in plan)])
+    return plan
+
+def iter_plan(plan: list[tuple[list[CompiledPattern], int]], rng=random) -> Iterator[str]:
+    """Yields the prompts of a plan one at a time (grammar is resolved by the compiled patterns)."""
+    for patterns, count in plan:
+        choice = rng.choice
+        for _ in range(count):
+            yield choice(patterns).render(rng)
+
+def iter_with_patterns(args, parts, dictionary: LoadedDictionary = None) -> Iterator[str]:
+    """Lazy version of generate_with_patterns: constant memory whatever num_prompts is."""
+    return iter_plan(pattern_plan(args, parts, dictionary))
+
+def generate_with_patterns(args, parts, dictionary: LoadedDictionary = None,
+                           compact: bool = False) -> "list[str] | CompactPrompts":
+    """All the prompts of a run at once; compact=True holds them as index rows (see CompactPrompts)."""
+    if compact:
+        return CompactPrompts.from_plan(pattern_plan(args, parts, dictionary))
+    return list(iter_with_patterns(args, parts, dictionary))
+
+# --- Generazione parallela (shard) ---
+
+# Prompt per shard: fisso, così l'output con lo stesso seed non dipende dal numero di worker
+SHARD_SIZE = 10000
+
+def shard_rng(seed: int, shard: int) -> random.Random:
+    """Independent, reproducible random generator for one shard of a seeded run."""
+    return random.Random(f"{seed}:{shard}")
+
+def plan_shards(plan: list[tuple[list[CompiledPattern], int]], shard_size: int = SHARD_SIZE) -> list[list[tuple[int, int]]]:
+    """
+    Splits a plan into consecutive shards of shard_size prompts. Each shard is a list of
+    (group index in the plan, count) pieces, in output order.
+    """
+    shards, current, room = [], [], shard_size
+    for g, (_, count) in enumerate(plan):
+        while count:
+            take = min(count, room)
+            current.append((g, take))
+            count -= take
+            room -= take
+            if not room:
+                shards.append(current)
+                current, room = [], shard_size
+    if current:
+        shards.append(current)
+    return shards
+
+def render_shard(groups: list[list[CompiledPattern]], seed: int, shard: int,
+                 pieces: list[tuple[int, int]], engine: str = "python") -> tuple[str, int]:
+    """Renders one shard as a block of joined prompts (same format as chunk_prompts)."""
+    out = []
+    if engine == "numpy":
+        gen = batch_rng(seed, shard)
+        for g, count in pieces:
+            out.extend(_batch_sampler(groups, g).sample(count, gen))
+        return PROMPT_SEPARATOR.join(out), len(out)
+    rng = shard_rng(seed, shard)
+    choice = rng.choice
+    for g, count in pieces:
+        patterns = groups[g]
+        for _ in range(count):
+            out.append(choice(patterns).render(rng))
+    return PROMPT_SEPARATOR.join(out), len(out)
+
+# Pattern compilati del processo worker, ricevuti una volta sola dall'initializer
+_WORKER_GROUPS = None
+
+def _init_worker(groups):
+    global _WORKER_GROUPS
+    _WORKER_GROUPS = groups
+
+def _render_shard_in_worker(task):
+    seed, shard, pieces, engine = task
+    block = render_shard(_WORKER_GROUPS, seed, shard, pieces, engine)
+    # Contatori d'uso delle varianti del worker, da riportare sulle copie del processo principale
+    uses = []
+    for patterns in _WORKER_GROUPS:
+        for v in pattern_variants(patterns):
+            uses.append(v.uses)
+            v.uses = 0
+    return block, uses
+
+def _add_worker_uses(groups: list[list[CompiledPattern]], uses: list[int]):
+    variants = [v for patterns in groups for v in pattern_variants(patterns)]
+    for v, n in zip(variants, uses):
+        v.uses += n
+
+def iter_seeded_blocks(plan: list[tuple[list[CompiledPattern], int]], seed: int,
+                       workers: int = 1, engine: str = "python", start: int = 0) -> Iterator[tuple[str, int]]:
+    """
+    Yields the shards of a seeded run in order, rendering them in a pool of worker processes.
+    The compiled patterns go to each worker once; only small shard descriptions are sent per
+    task, and at most two shards per worker are in flight so a slow writer applies backpressure.
+    The same seed gives the same blocks whatever the number of workers.
+    start: first prompt to render, at a shard boundary (or the end): the shards before it are skipped.
+    """
+    groups = [patterns for patterns, _ in plan]
+    total = sum(count for _, count in plan)
+    if start % SHARD_SIZE and start != total:
+        raise ValueError(f"❌ Il run può ripartire solo all'inizio di uno shard ({SHARD_SIZE} prompt), non da {start}.")
+    tasks = [(seed, k, pieces, engine) for k, pieces in enumerate(plan_shards(plan))][-(-start // SHARD_SIZE):]
+    if workers <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            yield render_shard(groups, *task)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+    from collections import deque
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(groups,)) as pool:
+        pending = deque()
+        tasks = iter(tasks)
+        for task in itertools.islice(tasks, 2 * workers):
+            pending.append(pool.submit(_render_shard_in_worker, task))
+        while pending:
+            block, uses = pending.popleft().result()
+            _add_worker_uses(groups, uses)
+            for task in itertools.islice(tasks, 1):
+                pending.append(pool.submit(_render_shard_in_worker, task))
+            yield block
+
+# --- Motore batch (NumPy opzionale) ---
+
+BATCH_SIZE = 10000
+
+def _import_numpy():
+    """Returns the numpy module, or None if it is not installed (it is an optional dependency)."""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+def batch_rng(seed: int = None, shard: int = 0):
+    """Random source for BatchSampler: a NumPy Generator, or random.Random without NumPy."""
+    np = _import_numpy()
+    if np is None:
+        return random.Random() if seed is None else shard_rng(seed, shard)
+    if seed is None:
+        return np.random.default_rng()
+    return np.random.default_rng([seed % 2 ** 64, shard])
+
+
+class BatchSampler:
+    """
+    Draws a whole block of prompts from a list of compiled patterns at once: pattern choices,
+    plural flags and word indices are NumPy integer arrays, with one draw per word list for the
+    whole block, and the strings are built from those arrays. Without NumPy the same block is
+    rendered one prompt at a time by the pure Python path.
+    """
+
+    def __init__(self, patterns: list[CompiledPattern]):
+        self.patterns = patterns
+        self.np = _import_numpy()
+        if self.np is None:
+            return
+        np = self.np
+        # Varianti distinte, e per ogni (pattern, plurale) l'indice della sua variante
+        self.variants, variant_of, seen = [], [], {}
+        for p in patterns:
+            for v in p.variants:
+                if id(v) not in seen:
+                    seen[id(v)] = len(self.variants)
+                    self.variants.append(v)
+                variant_of.append(seen[id(v)])
+        self.variant_of = np.array(variant_of, dtype=np.intp)
+        # Ogni lista di parole diventa un array di oggetti, una volta sola anche se condivisa
+        self.tables, self.slot_tables, table_ids = [], [], {}
+        # Per le liste con pesi: tabelle alias come array (None per le liste uniformi)
+        self.alias = []
+        for v in self.variants:
+            ids = []
+            for t in v.tables:
+                if id(t) not in table_ids:
+                    table_ids[id(t)] = len(self.tables)
+                    self.tables.append(np.array(t, dtype=object))
+                    self.alias.append((np.array(t._prob), np.array(t._alias, dtype=np.intp))
+                                      if isinstance(t, WeightedWords) else None)
+                ids.append(table_ids[id(t)])
+            self.slot_tables.append(ids)
+
+    def sample(self, k: int, gen) -> list[str]:
+        """k prompts, grammar already applied, in draw order."""
+        if self.np is None:
+            choice = gen.choice
+            return [choice(self.patterns).render(gen) for _ in range(k)]
+        np = self.np
+        pattern = gen.integers(0, len(self.patterns), k)
+        # 0 = plurale, come random.choice([True, False])
+        plural = gen.integers(0, 2, k)
+        vid = self.variant_of[pattern * 2 + plural]
+        order = np.argsort(vid, kind="stable")
+        counts = np.bincount(vid, minlength=len(self.variants))
+
+        # Un'unica estrazione per lista di parole, per tutto il blocco
+        needed = [0] * len(self.tables)
+        for v, ids in enumerate(self.slot_tables):
+            for t in ids:
+                needed[t] += int(counts[v])
+        draws = [self._draw(t, n, gen) for t, n in enumerate(needed)]
+        used = [0] * len(self.tables)
+
+        out = np.empty(k, dtype=object)
+        start = 0
+        for v, variant in enumerate(self.variants):
+            n = int(counts[v])
+            if not n:
+                continue
+            rows = order[start:start + n]
+            start += n
+            variant.uses += n
+            literals = variant.layout[0::2]
+            text = np.full(n, literals[0], dtype=object)
+            for j, t in enumerate(self.slot_tables[v]):
+                idx = draws[t][used[t]:used[t] + n]
+                used[t] += n
+                text = text + self.tables[t][idx]
+                if literals[j + 1]:
+                    text = text + literals[j + 1]
+            if variant.grammar_fallback:
+                text = np.array([variant._finish(p) for p in text], dtype=object)
+            out[rows] = text
+        return out.tolist()
+
+    def _draw(self, t: int, n: int, gen):
+        """n word indices for table t: uniform, or vectorised alias draws for weighted lists."""
+        size = len(self.tables[t])
+        if self.alias[t] is None:
+            return gen.integers(0, size, n)
+        prob, alias = self.alias[t]
+        u = gen.random(n) * size
+        i = u.astype(self.np.intp)
+        return self.np.where(u - i < prob[i], i, alias[i])
+
+def _batch_sampler(groups: list[list[CompiledPattern]], g: int) -> BatchSampler:
+    """BatchSampler for groups[g], built once per pattern list (and per worker process)."""
+    key = id(groups[g])
+    sampler = _BATCH_SAMPLERS.get(key)
+    if sampler is None or sampler.patterns is not groups[g]:
+        sampler = BatchSampler(groups[g])
+    _remember(_BATCH_SAMPLERS, key, sampler, BATCH_SAMPLERS_SIZE)
+    return sampler
+
+# Ogni sampler tiene vivi i suoi pattern (e le loro tabelle): solo gli ultimi usati
+BATCH_SAMPLERS_SIZE = 32
+_BATCH_SAMPLERS: dict[int, BatchSampler] = {}
+
+def iter_batch_blocks(plan: list[tuple[list[CompiledPattern], int]], gen=None,
+                      batch_size: int = BATCH_SIZE) -> Iterator[tuple[str, int]]:
+    """Renders a plan in blocks of batch_size prompts with BatchSampler."""
+    if gen is None:
+        gen = batch_rng()
+    for patterns, count in plan:
+        sampler = BatchSampler(patterns)
+        while count > 0:
+            k = min(count, batch_size)
+            yield PROMPT_SEPARATOR.join(sampler.sample(k, gen)), k
+            count -= k
+
+
+# --- Modalità combinatoria ---
+
+class CombinatorialSpace:
+    """
+    Every distinct prompt of a list of compiled patterns, addressed by one integer index:
+    patterns in order, then plural before singular, then the slot words as mixed-radix digits.
+    Nothing is materialised, any index range can be rendered without the ones before it.
+    """
+
+    def __init__(self, patterns: list[CompiledPattern]):
+        self.variants = [v for p in patterns for v in p.distinct_variants()]
+        self.offsets = []
+        total = 0
+        for v in self.variants:
+            self.offsets.append(total)
+            total += v.size()
+        self.total = total
+
+    def render(self, index: int) -> str:
+        if not 0 <= index < self.total:
+            raise IndexError(f"index {index} out of range (space size {self.total})")
+        k = bisect.bisect_right(self.offsets, index) - 1
+        variant = self.variants[k]
+        return variant.render_digits(variant.digits(index - self.offsets[k]))
+
+    def iter_range(self, start: int = 0, stop: int = None) -> Iterator[str]:
+        """Renders indices start..stop-1 (clipped to the space) in order."""
+        stop = self.total if stop is None else min(stop, self.total)
+        k = max(bisect.bisect_right(self.offsets, start) - 1, 0)
+        while start < stop and k < len(self.variants):
+            base = self.offsets[k]
+            end = min(stop, base + self.variants[k].size())
+            if start < end:
+                yield from self.variants[k].iter_range(start - base, end - base)
+                start = end
+            k += 1
+
+    def compact(self, start: int = 0, stop: int = None) -> "CompactPrompts":
+        """Indices start..stop-1 (clipped to the space) as a CompactPrompts, no text built."""
+        stop = self.total if stop is None else min(stop, self.total)
+        prompts = CompactPrompts(self.variants)
+        k = max(bisect.bisect_right(self.offsets, start) - 1, 0)
+        while start < stop and k < len(self.variants):
+            base = self.offsets[k]
+            end = min(stop, base + self.variants[k].size())
+            if start < end:
+                prompts.extend_range(k, start - base, end - base)
+                start = end
+            k += 1
+        return prompts
+
+# --- Prompt compatti (indici invece di testo) ---
+
+def _index_typecode(largest: int) -> str:
+    """Smallest unsigned array typecode that holds 0..largest."""
+    for code in ("H", "I", "L", "Q"):
+        if largest < 1 << (8 * array.array(code).itemsize):
+            return code
+    raise OverflowError(f"index {largest} too large for an array")
+
+
+class CompactPrompts:
+    """
+    Prompts held as integers instead of text: one fixed-width row per prompt in a single array,
+    the variant id followed by the index of the word picked for each slot (unused slots are 0).
+    A prompt costs width * itemsize bytes instead of a str object; the text is built only when a
+    prompt is read, usually by the writer through blocks(). Rows order like the prompts'
+    positions in the combinatorial space, so dedup, sorting and shuffling are done on integers.
+    """
+
+    def __init__(self, variants: list[_PatternVariant]):
+        self.variants = variants
+        self._ids = {id(v): k for k, v in enumerate(variants)}
+        self.width = 1 + max((len(v.tables) for v in variants), default=0)
+        largest = max([len(variants)] + [len(t) for v in variants for t in v.tables])
+        self.data = array.array(_index_typecode(largest))
+
+    @classmethod
+    def from_plan(cls, plan: list[tuple[list[CompiledPattern], int]], rng=random) -> "CompactPrompts":
+        """
+        Draws a plan like iter_plan, with the same random numbers in the same order: rendering the
+        rows gives exactly the prompts iter_plan would have yielded.
+        """
+        prompts = cls(pattern_variants(p for patterns, _ in plan for p in patterns))
+        ids, width, extend = prompts._ids, prompts.width, prompts.data.extend
+        randrange = rng.randrange
+        for patterns, count in plan:
+            # Per (pattern, plurale): id della variante, lunghezze delle liste e riempimento della riga
+            rows = [[(v, ids[id(v)], [len(t) for t in v.tables], [0] * (width - 1 - len(v.tables)),
+                      v.draw_digits if v.weighted else None)
+                     for v in p.variants] for p in patterns]
+            for _ in range(count):
+                v, vid, sizes, pad, draw = rows[randrange(len(rows))][randrange(2)]
+                v.uses += 1
+                extend([vid] + (draw(rng) if draw else [randrange(n) for n in sizes]) + pad)
+        return prompts
+
+    def extend_range(self, vid: int, start: int, stop: int):
+        """Appends combinations start..stop-1 of variant vid, in itertools.product order."""
+        variant = self.variants[vid]
+        sizes = [len(t) for t in variant.tables]
+        digits = variant.digits(start)
+        pad = [0] * (self.width - 1 - len(sizes))
+        last = len(sizes) - 1
+        extend = self.data.extend
+        for _ in range(stop - start):
+            extend([vid] + digits + pad)
+            j = last
+            while j >= 0:
+                digits[j] += 1
+                if digits[j] < sizes[j]:
+                    break
+                digits[j] = 0
+                j -= 1
+        variant.uses += stop - start
+
+    def __len__(self) -> int:
+        return len(self.data) // self.width
+
+    def row(self, i: int) -> tuple:
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return tuple(self.data[i * self.width:(i + 1) * self.width])
+
+    def __getitem__(self, i: int) -> str:
+        if i < 0:
+            i += len(self)
+        row = self.row(i)
+        return self.variants[row[0]].text(row[1:])
+
+    def __iter__(self) -> Iterator[str]:
+        data, width, variants = self.data, self.width, self.variants
+        for start in range(0, len(data), width):
+            yield variants[data[start]].text(data[start + 1:start + width])
+
+    def blocks(self, size: int = WRITE_CHUNK_PROMPTS) -> Iterator[tuple[str, int]]:
+        """Text blocks for write_prompt_blocks, built one chunk at a time."""
+        return chunk_prompts(iter(self), size)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.data) * self.data.itemsize
+
+    def _reorder(self, order: Iterable[int]) -> "CompactPrompts":
+        data, width = self.data, self.width
+        out = CompactPrompts(self.variants)
+        out.data = array.array(data.typecode)
+        for i in order:
+            out.data.extend(data[i * width:(i + 1) * width])
+        return out
+
+    def unique(self) -> "CompactPrompts":
+        """
+        Copy without repeated rows, first occurrence kept. Rows are word choices: a dictionary
+        listing the same word twice can still give two rows with the same text.
+        """
+        seen, keep = set(), []
+        width = self.width
+        for i in range(len(self)):
+            row = bytes(self.data[i * width:(i + 1) * width])
+            if row in seen:
+                self.variants[self.data[i * width]].uses -= 1
+            else:
+                seen.add(row)
+                keep.append(i)
+        return self._reorder(keep)
+
+    def sorted(self) -> "CompactPrompts":
+        """Copy in combinatorial order: by variant, then by word indices."""
+        width = self.width
+        return self._reorder(sorted(range(len(self)), key=lambda i: self.data[i * width:(i + 1) * width]))
+
+    def shuffled(self, rng=random) -> "CompactPrompts":
+        order = list(range(len(self)))
+        rng.shuffle(order)
+        return self._reorder(order)
+
+# --- Prompt unici (senza ripetizioni) ---
+
+class IndexPermutation:
+    """
+    Seeded bijection of range(size) with O(1) memory: a balanced Feistel network over the
+    smallest even bit width that covers size, with cycle walking to stay inside the range.
+    perm[i] for i = 0, 1, 2, ... visits every index exactly once, in a shuffled order.
+    """
+    ROUNDS = 6
+
+    def __init__(self, size: int, seed):
+        self.size = size
+        bits = max((size - 1).bit_length(), 2)
+        bits += bits & 1
+        self.half = bits // 2
+        self.mask = (1 << self.half) - 1
+        self.shift = max(self.half // 2, 1)
+        rng = random.Random(seed)
+        self.keys = [rng.getrandbits(self.half) for _ in range(self.ROUNDS)]
+        self.mult = rng.getrandbits(self.half) | 1
+
+    def _round(self, x: int, key: int) -> int:
+        h = ((x + key) * self.mult) & self.mask
+        h ^= h >> self.shift
+        return (h * self.mult) & self.mask
+
+    def _encrypt(self, x: int) -> int:
+        left, right = x >> self.half, x & self.mask
+        for key in self.keys:
+            left, right = right, left ^ self._round(right, key)
+        return (left << self.half) | right
+
+    def __getitem__(self, i: int) -> int:
+        if not 0 <= i < self.size:
+            raise IndexError(i)
+        # Cycle walking: il dominio è < 4 * size, in media meno di 4 passi
+        x = self._encrypt(i)
+        while x >= self.size:
+            x = self._encrypt(x)
+        return x
+
+
+def _distinct_parts(parts: dict[str, list[str]]) -> dict[str, list[str]]:
+    """parts with repeated words removed, so different indices always mean different prompts."""
+    return {k: list(dict.fromkeys(v)) if isinstance(v, list) and len(set(v)) != len(v) else v
+            for k, v in parts.items()}
+
+def iter_unique(plan: list[tuple[list[CompiledPattern], int]], parts: dict[str, list[str]],
+                seed: int = None, stats: "RunStats" = None) -> Iterator[str]:
+    """
+    Like iter_plan, but never repeats a prompt: every pattern walks its own combinatorial space
+    through a seeded IndexPermutation, and patterns are still picked at random until they run
+    out. When a group asks for more prompts than exist, the exact maximum is reported and
+    generated. Patterns whose texts overlap each other are not checked against each other.
+    """
+    rng = random if seed is None else random.Random(f"{seed}:unique")
+    parts = _distinct_parts(parts)
+    grammar = analyse_parts(parts)
+    for g, (patterns, count) in enumerate(plan):
+        spaces = [CombinatorialSpace([CompiledPattern(p.source, parts, grammar)]) for p in patterns]
+        if stats is not None:
+            stats.track(v for space in spaces for v in space.variants)
+        total = sum(space.total for space in spaces)
+        if count > total:
+            print(f"⚠️ Only {total} distinct prompts exist for these patterns: generating {total} instead of {count}.")
+            count = total
+        perms = [IndexPermutation(space.total, rng.getrandbits(64)) for space in spaces]
+        used = [0] * len(spaces)
+        alive = list(range(len(spaces)))
+        for _ in range(count):
+            i = rng.choice(alive)
+            yield spaces[i].render(perms[i][used[i]])
+            used[i] += 1
+            if used[i] == spaces[i].total:
+                alive.remove(i)
+
+# --- Copertura (--cover) ---
+
+class _CoverStream:
+    """Shuffled round-robin over the indices of one word list: every word once per round."""
+    __slots__ = ("order", "pos", "done", "rng")
+
+    def __init__(self, size: int, rng):
+        self.order = list(range(size))
+        rng.shuffle(self.order)
+        self.pos = 0
+        self.done = False
+        self.rng = rng
+
+    def take(self) -> int:
+        if self.pos == len(self.order):
+            self.rng.shuffle(self.order)
+            self.pos = 0
+        self.pos += 1
+        return self.order[self.pos - 1]
+
+    def covered(self) -> int:
+        return len(self.order) if self.done else self.pos
+
+def _cover_expected(plan: list[tuple[list[CompiledPattern], int]], slots: dict[int, list],
+                    lists: list[tuple[int, _CoverStream]]) -> "float | None":
+    """
+    Expected prompts until every (size, stream) list has had one slot per word, or None if the
+    plan is too short even on average. In each pattern group a list gets X slots per prompt, X
+    being the slot count of a (pattern, plural) variant drawn with equal chance; after t prompts
+    the total is taken as normal with the summed mean and variance, the lists as independent, and
+    E[T] is the sum over t of P(some list is still incomplete).
+    """
+    from math import erfc, sqrt
+    if not lists:
+        return 0.0
+    groups = []
+    for patterns, count in plan:
+        moments = []
+        for _, stream in lists:
+            xs = [slots[id(v)].count(stream) for p in patterns for v in p.variants]
+            mean = sum(xs) / len(xs)
+            moments.append((mean, sum(x * x for x in xs) / len(xs) - mean * mean))
+        groups.append((count, moments))
+    total = sum(count for count, _ in groups)
+
+    def at(t):
+        acc = [[0.0, 0.0] for _ in lists]
+        for count, moments in groups:
+            k = min(count, t)
+            for a, (mean, var) in zip(acc, moments):
+                a[0] += k * mean
+                a[1] += k * var
+            t -= k
+            if t <= 0:
+                break
+        return acc
+
+    if any(mean < size for (mean, _), (size, _) in zip(at(total), lists)):
+        return None
+
+    def incomplete(t):
+        done = 1.0
+        for (mean, var), (size, _) in zip(at(t), lists):
+            if var <= 0:
+                done *= mean >= size
+            else:
+                # P(slot >= size), con correzione di continuità
+                done *= 0.5 * erfc((size - 0.5 - mean) / sqrt(2 * var))
+        return 1.0 - done
+
+    # Solo la zona di transizione va sommata: prima P = 1, dopo P = 0
+    lo, hi = 0, total
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if incomplete(mid) > 1 - 1e-12:
+            lo = mid + 1
+        else:
+            hi = mid
+    start, hi = lo, total
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if incomplete(mid) > 1e-12:
+            lo = mid + 1
+        else:
+            hi = mid
+    step = max(1, (lo - start) // 20000)
+    return start + sum(incomplete(t) for t in range(start, lo, step)) * step
+
+def iter_cover(plan: list[tuple[list[CompiledPattern], int]], parts: dict[str, list[str]],
+               seed: int = None, stats: "RunStats" = None) -> Iterator[str]:
+    """
+    Like iter_plan, but the slots are filled from one shuffled round-robin stream per word list
+    instead of independent draws, so every word of every category the plan uses comes out in
+    about max(category size / its slots per prompt) prompts, instead of the coupon-collector
+    N log N. Patterns are still picked at random. Once everything is covered the rest of the
+    run is ordinary random generation (with word weights, ignored while covering).
+    The coverage reached is reported, and stored in stats.coverage.
+    """
+    rng = random if seed is None else random.Random(f"{seed}:cover")
+    streams, slots = {}, {}
+    for patterns, _ in plan:
+        for p in patterns:
+            for plural, v in zip((True, False), p.variants):
+                if id(v) in slots:
+                    continue
+                # Le tabelle delle varianti (forme grammaticali) hanno gli indici della lista di partenza
+                bases = [w for m in _PLACEHOLDER_RE.finditer(p.source)
+                         if (w := _resolve_category(parts, m[1], plural)) is not None]
+                for base in bases:
+                    if id(base) not in streams:
+                        streams[id(base)] = (base, _CoverStream(len(base), rng))
+                slots[id(v)] = [streams[id(base)][1] for base in bases]
+    if stats is not None:
+        stats.track(pattern_variants(p for patterns, _ in plan for p in patterns))
+
+    names = {}
+    for name, words in parts.items():
+        names.setdefault(id(words), []).append(name)
+    ideal = _cover_expected(plan, slots, [(len(base), stream) for base, stream in streams.values()])
+
+    def report(emitted, covered_at):
+        categories = {"/".join(names.get(key, ["?"])): [stream.covered(), len(base)]
+                      for key, (base, stream) in streams.items()}
+        total = sum(size for _, size in categories.values())
+        covered = sum(c for c, _ in categories.values())
+        estimate = "" if ideal is None else f" (expected about {ideal:.0f})"
+        if covered_at is not None:
+            print(f"🧩 Coverage: all {total} words of {len(categories)} categories used in {covered_at} prompts{estimate}.")
+        else:
+            missing = ", ".join(f"{name} {c}/{size}" for name, (c, size) in categories.items() if c < size)
+            print(f"⚠️ Coverage: {covered}/{total} words ({100 * covered / max(total, 1):.1f}%) after {emitted} prompts"
+                  f"{estimate}; incomplete: {missing}")
+        if stats is not None:
+            stats.coverage = {"words": total, "covered": covered, "prompts_to_cover": covered_at,
+                              "expected_prompts": None if ideal is None else round(ideal, 1),
+                              "categories": categories}
+
+    incomplete = len(streams)
+    emitted, covered_at = 0, None
+    if not incomplete:
+        covered_at = 0
+        report(0, 0)
+    for patterns, count in plan:
+        for _ in range(count):
+            v = rng.choice(patterns).variants[rng.randrange(2)]
+            if covered_at is not None:
+                yield v.render(rng)
+                continue
+            digits = []
+            for stream in slots[id(v)]:
+                digits.append(stream.take())
+                if not stream.done and stream.pos == len(stream.order):
+                    stream.done = True
+                    incomplete -= 1
+            emitted += 1
+            yield v.render_digits(digits)
+            if not incomplete:
+                covered_at = emitted
+                report(emitted, covered_at)
+    if covered_at is None:
+        report(emitted, None)
+
+def combinatorial_space(args, parts, dictionary: LoadedDictionary = None) -> CombinatorialSpace:
+    """Space of the patterns selected by --short/--long (same choice as the random mode)."""
+    return CombinatorialSpace([p for patterns, _ in pattern_plan(args, parts, dictionary) for p in patterns])
+
+def _combinatorial_range(args, parts, dictionary: LoadedDictionary = None, count: int = None,
+                         stats: "RunStats" = None) -> tuple[CombinatorialSpace, int, int]:
+    """The space of the run and the index range to generate, after the checks and the size message."""
+    space = combinatorial_space(args, parts, dictionary)
+    if stats is not None:
+        stats.track(space.variants)
+    offset = getattr(args, "offset", 0) or 0
+    if offset < 0:
+        raise ValueError("❌ --offset deve essere >= 0.")
+    if count is None:
+        limit = getattr(args, "limit", None)
+        count = args.num_prompts if limit is None else limit
+    if not getattr(args, "quiet", False):
+        print(f"🔢 Combinatorial space: {space.total} distinct prompts")
+    if offset >= space.total:
+        print(f"⚠️ Offset {offset} is past the end of the space ({space.total}), nothing to generate.")
+    return space, offset, offset + count
+
+def iter_combinatorial(args, parts, dictionary: LoadedDictionary = None, count: int = None,
+                       stats: "RunStats" = None, start: int = 0) -> Iterator[str]:
+    """
+    Lazily renders count prompts of the combinatorial space starting at --offset
+    (count defaults to --limit, then to --num-prompts). Prints the exact size first.
+    start skips the first start of those prompts (resumed runs).
+    """
+    space, first, stop = _combinatorial_range(args, parts, dictionary, count, stats)
+    return space.iter_range(min(first + start, stop), stop)
+
+def compact_combinatorial(args, parts, dictionary: LoadedDictionary = None, count: int = None,
+                          stats: "RunStats" = None) -> CompactPrompts:
+    """Same prompts as iter_combinatorial, held as index rows (see CompactPrompts)."""
+    space, start, stop = _combinatorial_range(args, parts, dictionary, count, stats)
+    return space.compact(start, stop)
+
+# --- API per librerie (anche asincrona) ---
+
+def run_args(input: str = "prompt_parts.json", n: int = 10, *, mode: str = "ran", length: str = "both",
+             seed: int = None, unique: bool = False, offset: int = 0, limit: int = None,
+             engine: str = "python", mix: dict[str, float] = None, cover: bool = False,
+             allow_missing: bool = False):
+    """
+    The args object main() and generation_blocks() work with, built from keyword arguments
+    instead of the command line (length: short, long or both; input: a file, or a list of
+    theme files and folders, with mix as in --mix). Raises ValueError on bad values.
+    """
+    import types
+    if mode not in ("ran", "comb", "both"):
+        raise ValueError("mode must be ran, comb or both")
+    if length not in ("short", "long", "both"):
+        raise ValueError("length must be short, long or both")
+    if engine not in ("python", "numpy"):
+        raise ValueError("engine must be python or numpy")
+    return types.SimpleNamespace(
+        input=input, num_prompts=n, mode=mode, short=length in ("short", "both"), long=length in ("long", "both"),
+        seed=seed, unique=unique, offset=offset, limit=limit, engine=engine, mix=mix, cover=cover,
+        allow_missing=allow_missing, custom_order=None,
+    )
+
+# Blocchi pronti al massimo in coda in agenerate, oltre a quello che il consumer sta leggendo
+AGENERATE_QUEUE_BLOCKS = 4
+
+async def agenerate(input: str = "prompt_parts.json", n: int = 10, *, queue_blocks: int = AGENERATE_QUEUE_BLOCKS,
+                    executor=None, **options) -> AsyncIterator[str]:
+    """
+    Asynchronous prompt generator for asyncio pipelines:
+
+        async for prompt in agenerate("template.json", 1000, length="short", seed=42):
+            await renderer.submit(prompt)
+
+    options are those of run_args. Prompts are rendered a block at a time (a shard with a
+    seed, WRITE_CHUNK_PROMPTS without) in executor, the loop's default one if None, so the event
+    loop is never blocked by generation. Blocks go through a queue of queue_blocks: when the
+    consumer falls behind, rendering pauses until it catches up. The prompts and their order
+    are those the command line writes with the same options and seed.
+    Raises ValueError for bad options, an unusable dictionary or missing patterns.
+    """
+    import asyncio
+    loop = asyncio.get_running_loop()
+    args = run_args(input, n, **options)
+    stats = RunStats()
+
+    def prepare():
+        dictionary = load_input(args.input, stats, args.mix)
+        if not dictionary.parts:
+            raise ValueError(f"❌ {input_label(args.input)}: dizionario non valido o vuoto.")
+        engine = args.engine if args.engine == "python" or _import_numpy() is not None else "python"
+        return generation_blocks(args, dictionary, stats, args.seed, 1, engine)
+
+    blocks = await loop.run_in_executor(executor, prepare)
+    queue = asyncio.Queue(max(queue_blocks, 1))
+    end = object()
+
+    async def produce():
+        try:
+            while True:
+                block = await loop.run_in_executor(executor, next, blocks, None)
+                if block is None:
+                    break
+                text, count = block
+                if count:
+                    # I prompt non contengono mai "\n" (spazi normalizzati in compilazione):
+                    # dividere sul separatore restituisce esattamente i prompt del blocco
+                    await queue.put(text.split(PROMPT_SEPARATOR))
+        except Exception as e:
+            await queue.put(e)
+        await queue.put(end)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            item = await queue.get()
+            if item is end:
+                break
+            if isinstance(item, Exception):
+                raise item
+            for prompt in item:
+                yield prompt
+    finally:
+        # Il consumer ha smesso (o c'è stato un errore): niente altri blocchi
+        producer.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await producer
+        close = getattr(blocks, "close", None)
+        if close is not None:
+            with contextlib.suppress(ValueError):
+                close()
+
+# --- Server locale (serve) ---
+
+# Secondi concessi a un client per inviare la richiesta
+REQUEST_TIMEOUT = 10
+
+def _http_head(status: int, headers: dict) -> bytes:
+    from http import HTTPStatus
+    lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}"]
+    lines += [f"{k}: {v}" for k, v in headers.items()]
+    lines.append("Connection: close")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+class PromptServer:
+    """
+    Long-lived local generator: dictionaries stay loaded and compiled between requests.
+    Speaks a minimal HTTP/1.1 (GET only, one request per connection) over TCP or a Unix socket:
+
+        GET /generate?input=template.json&n=100&length=short&seed=42
+        GET /generate?input=themes/fantasy.json&input=themes/scifi.json&mix=fantasy=3
+        GET /health
+
+    /generate streams the prompts as they are rendered, in the output file format ("\n_\n"
+    between prompts), with chunked transfer encoding. Other parameters: mode (ran, comb, both),
+    offset, limit, unique, cover, allow_missing, engine, like the command line options. Every request is seeded: the
+    seed comes from the query or is drawn at random and sent back in the X-Seed header, and the
+    body is byte-identical to the file `prompt_generator.py -i ... -n ... --seed <seed>` writes.
+
+    At most max_concurrent requests generate at the same time, max_pending more wait for a slot
+    and the others get 503. A block is rendered only after the previous one has been handed to
+    the socket, so a slow client slows down its own request instead of filling memory.
+    """
+
+    def __init__(self, max_concurrent: int = 4, max_pending: int = 64, max_prompts: int = 1_000_000,
+                 root: str = None):
+        import asyncio
+        from concurrent.futures import ThreadPoolExecutor
+        self.slots = asyncio.Semaphore(max_concurrent)
+        # Il rendering gira in thread: il loop resta libero di accettare e inviare
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="prompts")
+        self.max_concurrent = max_concurrent
+        self.max_pending = max_pending
+        self.max_prompts = max_prompts
+        self.root = os.path.abspath(root or os.getcwd())
+        self.preloaded = set()
+        self.active = self.pending = self.served = 0
+
+    def preload(self, filename: str) -> LoadedDictionary:
+        """
+        Loads and compiles a dictionary (or a folder of themes) before the first request;
+        it may live outside root.
+        """
+        dictionary = load_input(filename)
+        if not dictionary.parts:
+            raise ValueError(f"❌ {filename}: dizionario non valido o vuoto.")
+        for key in dictionary.patterns:
+            dictionary.compiled(key)
+        # Le richieste che usano pattern non risolvibili avranno un 400 con lo stesso elenco
+        warn_problems(dictionary)
+        self.preloaded.add(os.path.abspath(filename))
+        self.preloaded.update(os.path.abspath(f) for f in theme_files(filename))
+        return dictionary
+
+    def resolve(self, filename: str) -> str:
+        """Absolute path of a requested input: preloaded files, or files under root."""
+        path = os.path.abspath(os.path.join(self.root, filename))
+        if path not in self.preloaded and os.path.commonpath([path, self.root]) != self.root:
+            raise PermissionError(f"{filename} is outside the served folder")
+        return path
+
+    def request_args(self, query: dict[str, list[str]]):
+        """The query of /generate as the args object main() works with. Raises ValueError."""
+        def get(name, default=None):
+            values = query.get(name)
+            return values[-1] if values else default
+
+        def integer(name, default):
+            value = get(name)
+            if value is None:
+                return default
+            try:
+                return int(value)
+            except ValueError:
+                raise ValueError(f"{name} must be an integer") from None
+
+        num_prompts = integer("n", 10)
+        if not 0 <= num_prompts <= self.max_prompts:
+            raise ValueError(f"n must be between 0 and {self.max_prompts}")
+        limit = integer("limit", None)
+        if limit is not None and not 0 <= limit <= self.max_prompts:
+            raise ValueError(f"limit must be between 0 and {self.max_prompts}")
+        offset = integer("offset", 0)
+        if offset < 0:
+            raise ValueError("offset must be >= 0")
+        mode = get("mode", "ran")
+        if mode in ("comb", "both"):
+            # Il combinatorio genera limit prompt (n se manca): mai più di max_prompts
+            limit = min(num_prompts if limit is None else limit, self.max_prompts)
+        seed = integer("seed", None)
+        if seed is None:
+            seed = random.SystemRandom().randrange(2 ** 63)
+        # input ripetuto: più temi; mix=tema=quota, ripetuto per più temi
+        inputs = [self.resolve(i) for i in query.get("input") or ["prompt_parts.json"]]
+        mix = dict(parse_mix(m) for m in query.get("mix", []))
+        args = run_args(inputs[0] if len(inputs) == 1 else inputs, num_prompts, mode=mode,
+                        length=get("length", "both"), seed=seed, unique=get("unique", "0").lower() in ("1", "true", "yes"),
+                        offset=offset, limit=limit, engine=get("engine", "python"),
+                        mix=mix or None, cover=get("cover", "0").lower() in ("1", "true", "yes"),
+                        allow_missing=get("allow_missing", "0").lower() in ("1", "true", "yes"))
+        # Niente messaggi informativi per richiesta sullo stdout del server
+        args.quiet = True
+        return args
+
+    def _prepare(self, args, stats: RunStats):
+        """Runs in the executor: dictionary (warm after the first request) and lazy blocks."""
+        dictionary = load_input(args.input, stats, args.mix)
+        if not dictionary.parts:
+            raise ValueError(f"❌ {input_label(args.input)}: dizionario non valido o vuoto.")
+        engine = args.engine if args.engine == "python" or _import_numpy() is not None else "python"
+        return generation_blocks(args, dictionary, stats, args.seed, 1, engine)
+
+    async def _respond(self, writer, status: int, body: str, content_type: str = "text/plain; charset=utf-8"):
+        data = body.encode("utf-8")
+        writer.write(_http_head(status, {"Content-Type": content_type, "Content-Length": len(data)}) + data)
+        await writer.drain()
+
+    async def handle(self, reader, writer):
+        """One connection: reads the request line and headers, answers, closes."""
+        import asyncio
+        from urllib.parse import parse_qs, urlsplit
+        try:
+            try:
+                head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), REQUEST_TIMEOUT)
+                method, target, _ = head.split(b"\r\n", 1)[0].decode("latin-1").split(" ", 2)
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError):
+                return
+            except ValueError:
+                await self._respond(writer, 400, "Malformed request line\n")
+                return
+            url = urlsplit(target)
+            if method != "GET":
+                await self._respond(writer, 405, "Only GET is supported\n")
+            elif url.path == "/generate":
+                await self.generate(parse_qs(url.query), writer)
+            elif url.path == "/health":
+                import json
+                await self._respond(writer, 200, json.dumps({
+                    "active": self.active, "pending": self.pending, "served": self.served,
+                    "max_concurrent": self.max_concurrent, "dictionaries": sorted(_DICTIONARY_CACHE),
+                }) + "\n", "application/json")
+            else:
+                await self._respond(writer, 404, "Use /generate or /health\n")
+        except ConnectionError:
+            pass
+        except Exception:
+            # Mai un'eccezione non gestita nel task della connessione
+            import traceback
+            traceback.print_exc()
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def generate(self, query: dict[str, list[str]], writer):
+        import asyncio
+        try:
+            args = self.request_args(query)
+        except PermissionError as e:
+            await self._respond(writer, 403, f"{e}\n")
+            return
+        except ValueError as e:
+            await self._respond(writer, 400, f"{e}\n")
+            return
+        if self.pending >= self.max_pending:
+            await self._respond(writer, 503, "Too many requests waiting, try again later\n")
+            return
+
+        self.pending += 1
+        try:
+            await self.slots.acquire()
+        finally:
+            self.pending -= 1
+        self.active += 1
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        stats = RunStats()
+        blocks = None
+        count = 0
+        streaming = False
+        try:
+            try:
+                blocks = await loop.run_in_executor(self.executor, self._prepare, args, stats)
+            except ValueError as e:
+                await self._respond(writer, 400, f"{e}\n")
+                return
+            writer.write(_http_head(200, {
+                "Content-Type": "text/plain; charset=utf-8",
+                "Transfer-Encoding": "chunked",
+                "X-Seed": args.seed,
+                "X-Dictionary-Source": stats.dictionary_source,
+            }))
+            streaming = True
+            while True:
+                block = await loop.run_in_executor(self.executor, next, blocks, None)
+                if block is None:
+                    break
+                text, n = block
+                if not n:
+                    continue
+                # Separatore prima di ogni blocco tranne il primo, come nel file
+                data = ((PROMPT_SEPARATOR if count else "") + text).encode("utf-8")
+                writer.write(b"%x\r\n%b\r\n" % (len(data), data))
+                # Backpressure: il blocco successivo si genera solo quando il client ha letto questo
+                await writer.drain()
+                count += n
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        except ConnectionError:
+            raise
+        except Exception:
+            import traceback
+            print(f"ERROR {input_label(args.input)} seed={args.seed} after {count} prompts:", file=sys.stderr)
+            traceback.print_exc()
+            if not streaming:
+                await self._respond(writer, 500, "Generation failed, see the server log\n")
+            # Già in streaming: si chiude senza il chunk finale, il client vede una risposta
+            # interrotta (errore di chunked encoding) invece di un 200 troncato ma "completo"
+        finally:
+            close = getattr(blocks, "close", None)
+            if close is not None:
+                try:
+                    close()
+                except ValueError:
+                    # Generatore ancora in uso nel thread di una richiesta annullata
+                    pass
+            self.active -= 1
+            self.served += 1
+            self.slots.release()
+            print(f"📨 {input_label(args.input)} mode={args.mode} n={args.num_prompts} seed={args.seed}: "
+                  f"{count} prompts in {time.perf_counter() - start:.3f} s", flush=True)
+
+async def serve(server: PromptServer, host: str = "127.0.0.1", port: int = 8765, socket_path: str = None):
+    """Runs the server until it is cancelled (Ctrl+C)."""
+    import asyncio
+    if socket_path:
+        listener = await asyncio.start_unix_server(server.handle, path=socket_path)
+        where = f"unix:{socket_path}"
+    else:
+        listener = await asyncio.start_server(server.handle, host, port)
+        port = listener.sockets[0].getsockname()[1]
+        where = f"http://{host}:{port}"
+    print(f"🌐 Serving prompts on {where} (max {server.max_concurrent} concurrent requests)", flush=True)
+    async with listener:
+        await listener.serve_forever()
+
+def serve_command(argv: list[str]) -> int:
+    """python prompt_generator.py serve [--port N | --socket PATH] [--preload file.json ...]"""
+    import argparse
+    import asyncio
+    parser = argparse.ArgumentParser(prog="prompt_generator.py serve",
+                                     description="Server locale che tiene i dizionari caricati tra una richiesta e l'altra.")
+    parser.add_argument("--host", default="127.0.0.1", help="Indirizzo di ascolto (default: solo locale)")
+    parser.add_argument("--port", type=int, default=8765, help="Porta TCP (0: una porta libera qualsiasi)")
+    parser.add_argument("--socket", metavar="PATH", help="Ascolta su un socket Unix invece che su TCP")
+    parser.add_argument("--max-concurrent", type=int, default=4, help="Richieste generate in parallelo")
+    parser.add_argument("--max-pending", type=int, default=64, help="Richieste in attesa prima di rispondere 503")
+    parser.add_argument("--max-prompts", type=int, default=1_000_000, help="Prompt massimi per richiesta")
+    parser.add_argument("--preload", nargs="*", default=[], metavar="FILE", help="Dizionari da caricare all'avvio")
+    args = parser.parse_args(argv)
+    if args.max_concurrent < 1:
+        parser.error("--max-concurrent must be at least 1")
+
+    if not args.socket and args.host not in ("127.0.0.1", "localhost", "::1"):
+        print(f"⚠️ Listening on {args.host}: there is no authentication, anyone who can reach it can use it.")
+    server = PromptServer(args.max_concurrent, args.max_pending, args.max_prompts)
+    for filename in args.preload:
+        try:
+            dictionary = server.preload(filename)
+        except ValueError as e:
+            print(f"ERROR: {e}", file=sys.stderr)
+            return 1
+        patterns = sum(len(p) for p in dictionary.patterns.values())
+        print(f"📚 {filename}: {len(dictionary.parts)} categories, {patterns} patterns loaded")
+    try:
+        asyncio.run(serve(server, args.host, args.port, args.socket))
+    except KeyboardInterrupt:
+        print("Server stopped.")
+    finally:
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+    return 0
+
+# Funzione custom_order_args rimossa perché la modalità custom non è più supportata
+
+# Prompt tra un checkpoint e l'altro nei run avviati dal menu
+MENU_CHECKPOINT_EVERY = 1_000_000
+
+def interactive_menu():
+    print("🔮=== Mad Prompt Generator ===🔮")
+    print("Welcome to the prompt generator! All prompts are in English. (Half the code is in Italian, but don't mind that!(I'm working on it...))")
+    print("You can choose between: Random, Combinatorial, or Both (about half and half).")
+    print("After that, you can choose which patterns to use. The associated JSON file already contains some patterns, but feel free to add your own.")
+    print("Example of a short pattern:")
+    print("'The {Adjectives} {Nouns_singular} {Verbs_singular} through {Adjectives} {Nouns_plural}, {Verbs_singular} {Adjectives} {Nouns_plural} across the {Adjectives} {Nouns_singular}.'")
+    print("Just remember to use curly braces {} for placeholders, not parentheses ().")
+    print("Have fun! The options should be pretty clear (I hope).")
+    print("Enjoy,")
+    print("Your friendly neighbourhood Web Witch,")
+    print("    WitchRinnie.🔮")
+    last_outfile = ""
+    outdir = input("Output folder (press Enter for current folder): ").strip()
+    while True:
+        # Loop for valid mode selection or exit with easter egg
+        while True:
+            mode = input("Choose mode: ran (random) / comb (combinatorial) / both (random+combinatorial) [default: ran, or type 'sayfriendtoexit'-joking. Type  exit' to quit]: ") or "ran"
+            mode = mode.strip().lower()
+            if mode == "exit":
+                print("Goodbye, come back soon!🔮")
+                print(f"Last generated file: {last_outfile}")
+                sys.exit(0)
+            if mode in ["sayfriendstoexit", "mellon"]:
+                print("I knew you'd try that.🧙‍♀️")
+                input("Press Enter to continue or type exit, silly")
+                continue
+            if mode == "silly":
+                print("\n(╮°-°)╮┳━━┳ \n( ╯°□°)╯ ┻━━┻\n<(￣ ﹌ ￣)>\n┬─┬ノ( º _ ºノ)")
+                print("I'm not a silly, but thanks anyway.🧙‍♀️")
+                input("Guess:")
+                continue
+            if mode in ["ran", "comb", "both"]:
+                break
+            print("Invalid mode! Choose among: ran, comb, both or type 'exit' to quit.")
+
+
+        num = input("How many prompts do you want to generate? [default: 10]: ") or "10"
+        infile_input = input("Input file name (you can omit the extension); default: [prompt_parts.json]: ") or "prompt_parts.json"
+        print("The validity and encoding of the JSON will be checked during loading!")
+        outfile_input = input("Output file name (you can omit  the extension here too!) or press Enter for auto-name: ")
+
+        # Add .json only if there is NO extension
+        if infile_input and not os.path.splitext(infile_input)[1]:
+            infile_input += ".json"
+        infile = os.path.join(outdir, infile_input) if outdir else infile_input
+
+        if not os.path.exists(infile):
+            print(f"WARNING: Input file '{infile}' does not exist!")
+            continue
+
+        # The validity and encoding of the JSON will be checked later by load_parts/load_json_with_encoding
+
+        if outfile_input:
+            outfile = f"{outfile_input}.txt"
+            outfile = os.path.join(outdir, outfile) if outdir else outfile
+        else:
+            outfile = get_next_output_filename(outdir=outdir)
+
+        last_outfile = outfile
+
+        class FakeArgs:
+            pass
+
+        fake_args = FakeArgs()
+
+        # --- REQUIRED ATTRIBUTES ---
+        fake_args.mode = mode
+        fake_args.num_prompts = int(num)
+        fake_args.input = infile
+        fake_args.output = outfile
+        fake_args.comma = ","
+
+        # --- PATTERN ATTRIBUTES ---
+        fake_args.short = False
+        fake_args.long = False
+
+        # --- CATEGORY ATTRIBUTES (ERROR PREVENTION) ---
+        fake_args.articles = None
+        fake_args.adjectives = None
+        fake_args.nouns = None
+        fake_args.prepositions = None
+        fake_args.pronouns = None
+        fake_args.conjunctions = None
+        fake_args.verbs = None
+        fake_args.adverbs = None
+        fake_args.styles = None
+        fake_args.dramatic_lighting = None
+        fake_args.color_tones = None
+        fake_args.custom_order = None  # IMPORTANT!
+        # Run lunghi interrotti con Ctrl+C: si riprendono da riga di comando (il comando viene stampato)
+        fake_args.checkpoint_every = MENU_CHECKPOINT_EVERY if int(num) > MENU_CHECKPOINT_EVERY else None
+
+        # Pattern choice management ONLY for compatible modes
+        if mode in ["ran", "comb", "both"]:
+            print("Do you want to use long patterns, short patterns, or both?")
+            print("Type 'l' for long, 's' for short, 'b' for both [default: b]:")
+            pattern_choice = input().strip().lower() or "b"
+
+            if pattern_choice == "l":
+                fake_args.long = True
+            elif pattern_choice == "s":
+                fake_args.short = True
+            elif pattern_choice == "b":
+                fake_args.short = True
+                fake_args.long = True
+
+        # SINGLE CALL to main
+        try:
+            main(fake_args)  # Pass the fake_args object
+        except Exception as e:
+            print(f"ERROR during generation: {e}")
+            # Il nome automatico era riservato: se non è stato scritto nulla torna libero
+            if not outfile_input:
+                release_output_filename(outfile)
+        print("...")
+        print(f"\nPrompts generated and saved in: {outfile}")
+        print("\nBatch completed. Press Enter to continue or 'n' to exit.")
+        if not should_continue():
+            print(f"Last generated file: {last_outfile}")
+            print("Goodbye, come back soon!🔮")
+            break
+
+def should_continue():
+    """
+    Asks the user if they want to generate another batch.
+    Returns True to continue, False to exit.
+    """
+    again = input("\nDo you want to generate another batch? (Enter for yes, n for no): ")
+    return again.strip().lower() != "n"
+
+def run_program():
+    """
+    Avvia il programma: se non ci sono argomenti, mostra il menu interattivo, altrimenti esegue la generazione.
+    Gestisce eventuali errori fatali.
+    """
+    try:
+        if len(sys.argv) == 1:
+            interactive_menu()
+        else:
+            main()
+    except Exception as e:
+        print(f"ERRORE FATALE: {e}")
+        input("Premi invio per uscire...")
+
+def start():
+    """Command line entry point, called by prompt_generator.py: menu without arguments, otherwise main()."""
+    # Necessario per i worker quando lo script è impacchettato in un eseguibile
+    if getattr(sys, 'frozen', False):
+        import multiprocessing
+        multiprocessing.freeze_support()
+    chdir_to_program()
+    if len(sys.argv) > 1:
+        main()
+    else:
+        run_program()
+
+if __name__ == "__main__":
+    start()
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# prompt_generator.py (il launcher), mad_prompt_generator.py e benchmark.py sono moduli singoli
+# nella radice del repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,62 @@
+"""Block-compressed output and its index: PromptReader gives back exactly the prompts written."""
+
+import contextlib
+import gzip
+import io
+import json
+import lzma
+import random
+
+import pytest
+
+import prompt_generator as pg
+
+# Più blocchi di WRITE_CHUNK_PROMPTS, con caratteri che jsonl deve codificare
+PROMPTS = [f"prompt {i} \"quoted\" ünïcode ✨ \\ back" if i % 7 == 0 else f"a prompt number {i}"
+           for i in range(3 * pg.WRITE_CHUNK_PROMPTS + 123)]
+
+
+def write(path, **options) -> str:
+    filename = pg.output_filename(str(path), options.get("compression", "none"))
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert pg.write_prompts(PROMPTS, filename, **options) == len(PROMPTS)
+    return filename
+
+
+@pytest.mark.parametrize("fmt", pg.OUTPUT_FORMATS)
+@pytest.mark.parametrize("compression", ["gzip", "xz", "none"])
+def test_reader_round_trip(tmp_path, fmt, compression):
+    filename = write(tmp_path / f"out.{fmt}", fmt=fmt, compression=compression, index=True)
+    rng = random.Random(0)
+    with pg.PromptReader(filename) as reader:
+        assert len(reader) == len(PROMPTS)
+        assert list(reader) == PROMPTS
+        for n in [0, len(PROMPTS) - 1, -1, *rng.sample(range(len(PROMPTS)), 50)]:
+            assert reader[n] == PROMPTS[n]
+        # Intervalli a cavallo dei blocchi
+        for start in [0, pg.WRITE_CHUNK_PROMPTS - 3, 2 * pg.WRITE_CHUNK_PROMPTS + 5]:
+            assert reader.range(start, start + 10) == PROMPTS[start:start + 10]
+        assert reader.range(len(PROMPTS) - 5, len(PROMPTS) + 100) == PROMPTS[-5:]
+        with pytest.raises(IndexError):
+            reader[len(PROMPTS)]
+
+
+@pytest.mark.parametrize("compression, open_file", [("gzip", gzip.open), ("xz", lzma.open)])
+def test_compressed_blocks_read_as_one_file(tmp_path, compression, open_file):
+    # I blocchi compressi uno per uno si leggono in sequenza come un file solo (zcat, xzcat)
+    filename = write(tmp_path / "out.txt", compression=compression)
+    with open_file(filename, "rt", encoding="utf-8") as f:
+        assert f.read() == pg.PROMPT_SEPARATOR.join(PROMPTS)
+    filename = write(tmp_path / "out.jsonl", fmt="jsonl", compression=compression)
+    with open_file(filename, "rt", encoding="utf-8") as f:
+        assert [json.loads(line) for line in f] == PROMPTS
+
+
+@pytest.mark.parametrize("which, expected", [
+    ("5", PROMPTS[5:6]), ("-1", PROMPTS[-1:]), ("10:13", PROMPTS[10:13]), ("-5:", PROMPTS[-5:]),
+    ("-5:-2", PROMPTS[-5:-2]), (":3", PROMPTS[:3]), ("4100:4105", PROMPTS[4100:4105]),
+])
+def test_read_command_uses_slice_semantics(tmp_path, capsys, which, expected):
+    filename = write(tmp_path / "out.txt", compression="gzip")
+    assert pg.read_command([filename, which]) == 0
+    assert capsys.readouterr().out == pg.PROMPT_SEPARATOR.join(expected) + "\n"
@@ -0,0 +1,76 @@
+"""--checkpoint-every / --resume: a run resumed after a failure writes the same bytes as one that never stopped."""
+
+import contextlib
+import io
+import os
+
+import pytest
+
+import prompt_generator as pg
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "template.json")
+
+
+class Crash(Exception):
+    pass
+
+
+def run(output: str, mode: str, n: int, compression: str, resume: bool = False):
+    args = pg.run_args(TEMPLATE, n, mode=mode, seed=11)
+    args.output = output
+    args.checkpoint_every = 5000
+    args.resume = resume
+    args.compress = compression
+    args.index = True
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        pg.main(args)
+
+
+def crash_after(monkeypatch, blocks: int):
+    """generation_blocks stops with Crash after the given number of blocks."""
+    generation_blocks = pg.generation_blocks
+
+    def failing(*args, **kwargs):
+        def blocks_then_crash():
+            for i, block in enumerate(generation_blocks(*args, **kwargs)):
+                if i == blocks:
+                    raise Crash()
+                yield block
+        return blocks_then_crash()
+    monkeypatch.setattr(pg, "generation_blocks", failing)
+
+
+def read_bytes(filename: str) -> bytes:
+    with open(filename, "rb") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("mode, n", [("ran", 35_000), ("comb", 30_000)])
+@pytest.mark.parametrize("compression", ["none", "gzip"])
+def test_resumed_run_matches_uninterrupted_run(tmp_path, monkeypatch, mode, n, compression):
+    whole = pg.output_filename(str(tmp_path / "whole.txt"), compression)
+    resumed = pg.output_filename(str(tmp_path / "resumed.txt"), compression)
+    run(whole, mode, n, compression)
+
+    with monkeypatch.context() as m:
+        crash_after(m, 2)
+        with pytest.raises(Crash):
+            run(resumed, mode, n, compression)
+    assert os.path.exists(resumed + pg.CHECKPOINT_SUFFIX)
+    assert 0 < os.path.getsize(resumed) < os.path.getsize(whole)
+    run(resumed, mode, n, compression, resume=True)
+
+    assert read_bytes(resumed) == read_bytes(whole)
+    assert read_bytes(resumed + pg.INDEX_SUFFIX) == read_bytes(whole + pg.INDEX_SUFFIX)
+    assert not os.path.exists(resumed + pg.CHECKPOINT_SUFFIX)
+    assert not os.path.exists(whole + pg.CHECKPOINT_SUFFIX)
+
+
+def test_resume_refuses_a_different_run(tmp_path, monkeypatch):
+    output = str(tmp_path / "out.txt")
+    with monkeypatch.context() as m:
+        crash_after(m, 2)
+        with pytest.raises(Crash):
+            run(output, "ran", 35_000, "none")
+    with pytest.raises(ValueError, match="num_prompts"):
+        run(output, "ran", 40_000, "none", resume=True)
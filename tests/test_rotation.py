@@ -0,0 +1,57 @@
+"""Rotating output: the parts joined back together are the unsplit file, and each respects its limits."""
+
+import contextlib
+import gzip
+import io
+import os
+
+import pytest
+
+import prompt_generator as pg
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "template.json")
+# Lunghezze diverse, così i limiti in byte tagliano i blocchi in punti diversi
+PROMPTS = [f"prompt {i} " + "é" * (i % 37) for i in range(10_000)]
+
+
+def read_text(filename: str) -> str:
+    opener = gzip.open if filename.endswith(".gz") else open
+    with opener(filename, "rt", encoding="utf-8") as f:
+        return f.read()
+
+
+def parts_of(filename: str) -> list[str]:
+    parts = []
+    while os.path.exists(name := pg.part_filename(filename, len(parts) + 1)):
+        parts.append(name)
+    return parts
+
+
+@pytest.mark.parametrize("compression", ["none", "gzip"])
+@pytest.mark.parametrize("max_prompts, max_bytes", [(1000, None), (3333, None), (None, 20_000), (700, 9_000)])
+def test_parts_concatenate_to_the_unsplit_output(tmp_path, compression, max_prompts, max_bytes):
+    whole = pg.output_filename(str(tmp_path / "whole.txt"), compression)
+    split = pg.output_filename(str(tmp_path / "split.txt"), compression)
+    with contextlib.redirect_stdout(io.StringIO()):
+        pg.write_prompt_blocks(pg.chunk_prompts(PROMPTS), whole, compression=compression)
+        total = pg.write_rotating(pg.chunk_prompts(PROMPTS), split, None, max_prompts, max_bytes,
+                                  compression=compression)
+    assert total == len(PROMPTS)
+    texts = [read_text(name) for name in parts_of(split)]
+    assert len(texts) > 1
+    assert pg.PROMPT_SEPARATOR.join(texts) == read_text(whole)
+    for text in texts:
+        if max_prompts:
+            assert len(text.split(pg.PROMPT_SEPARATOR)) <= max_prompts
+        if max_bytes:
+            assert len(text.encode("utf-8")) <= max_bytes
+
+
+def test_bad_limits_leave_no_reserved_file(tmp_path):
+    for limits in ({"max_prompts_per_file": 0}, {"max_prompts_per_file": -3}, {"max_bytes_per_file": 0}):
+        args = pg.run_args(TEMPLATE, 10, seed=1)
+        args.output = str(tmp_path)
+        vars(args).update(limits)
+        with pytest.raises(ValueError), contextlib.redirect_stdout(io.StringIO()):
+            pg.main(args)
+    assert os.listdir(tmp_path) == []
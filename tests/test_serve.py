@@ -0,0 +1,93 @@
+"""serve: bounded concurrency, 503 backpressure and the per-request limits, against an in-process server."""
+
+import asyncio
+import os
+import threading
+
+import prompt_generator as pg
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class GatedServer(pg.PromptServer):
+    """Requests hold their slot until gate is set; peak counts the requests generating at once."""
+
+    def __init__(self, **kwargs):
+        super().__init__(root=ROOT, **kwargs)
+        self.gate = threading.Event()
+        self.lock = threading.Lock()
+        self.running = self.peak = 0
+
+    def _prepare(self, args, stats):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        try:
+            self.gate.wait(10)
+            return super()._prepare(args, stats)
+        finally:
+            with self.lock:
+                self.running -= 1
+
+
+async def get(port: int, query: str) -> tuple[int, bytes]:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET /generate?{query} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode("latin-1"))
+    await writer.drain()
+    data = await reader.read()
+    writer.close()
+    await writer.wait_closed()
+    head, _, body = data.partition(b"\r\n\r\n")
+    return int(head.split()[1]), body
+
+
+async def until(condition, timeout: float = 10):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        assert loop.time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def run_with_server(server, scenario):
+    async def main():
+        listener = await asyncio.start_server(server.handle, "127.0.0.1", 0)
+        try:
+            return await scenario(listener.sockets[0].getsockname()[1])
+        finally:
+            server.gate.set()
+            listener.close()
+            await listener.wait_closed()
+            server.executor.shutdown(wait=True)
+    return asyncio.run(main())
+
+
+def test_concurrency_is_bounded_and_overflow_gets_503():
+    server = GatedServer(max_concurrent=2, max_pending=1)
+
+    async def scenario(port):
+        queries = [f"input=template.json&n=50&seed={i}" for i in range(3)]
+        held = [asyncio.create_task(get(port, q)) for q in queries]
+        # Due richieste generano, la terza aspetta uno slot
+        await until(lambda: server.active == 2 and server.pending == 1)
+        status, _ = await get(port, "input=template.json&n=50&seed=9")
+        assert status == 503
+        server.gate.set()
+        return await asyncio.gather(*held)
+
+    replies = run_with_server(server, scenario)
+    assert [status for status, _ in replies] == [200, 200, 200]
+    assert all(body for _, body in replies)
+    assert server.peak == 2
+    assert server.served == 3 and server.active == 0 and server.pending == 0
+
+
+def test_limits_are_capped_at_max_prompts():
+    server = GatedServer(max_prompts=100)
+    server.gate.set()
+
+    async def scenario(port):
+        return [(await get(port, f"input=template.json&{q}"))[0]
+                for q in ("n=101", "mode=comb&limit=5000", "mode=comb&offset=-1", "mode=comb&limit=100")]
+
+    assert run_with_server(server, scenario) == [400, 400, 400, 200]
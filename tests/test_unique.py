@@ -0,0 +1,42 @@
+"""--unique: IndexPermutation is a bijection and no prompt comes out twice."""
+
+import json
+import os
+
+import prompt_generator as pg
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "template.json")
+
+
+def generate(input: str, n: int, **options) -> list[str]:
+    args = pg.run_args(input, n, **options)
+    blocks = pg.generation_blocks(args, pg.load_input(input), pg.RunStats(), args.seed)
+    return [p for text, count in blocks if count for p in text.split(pg.PROMPT_SEPARATOR)]
+
+
+def test_index_permutation_is_a_bijection():
+    for size in [*range(1, 301), 1023, 1024, 1025, 65537, 100_000]:
+        perm = pg.IndexPermutation(size, 42)
+        assert sorted(perm[i] for i in range(size)) == list(range(size)), size
+
+
+def test_index_permutation_depends_on_the_seed():
+    a, b = pg.IndexPermutation(1000, 1), pg.IndexPermutation(1000, 2)
+    assert [a[i] for i in range(1000)] != [b[i] for i in range(1000)]
+
+
+def test_unique_prompts_are_distinct():
+    prompts = generate(TEMPLATE, 30000, length="short", unique=True, seed=1)
+    assert len(prompts) == 30000
+    assert len(set(prompts)) == len(prompts)
+
+
+def test_unique_stops_at_the_number_of_distinct_prompts(tmp_path):
+    # Parole ripetute e due pattern con lo stesso testo possibile: i duplicati non devono uscire
+    path = tmp_path / "small.json"
+    path.write_text(json.dumps({"prompt_dictionary": {
+        "Patterns_short": ["{Adjectives} {Colours}.", "{Colours} {Adjectives}."],
+        "Dictionary": {"Adjectives": ["big", "small", "big"], "Colours": ["red", "blue", "green"]},
+    }}), encoding="utf-8")
+    prompts = generate(str(path), 100, length="short", unique=True, seed=3)
+    assert len(prompts) == len(set(prompts)) == 12
@@ -0,0 +1,76 @@
+"""Weighted categories: the alias-table draws must follow the weights (fixed seeds, so deterministic)."""
+
+import math
+import random
+
+import pytest
+
+import prompt_generator as pg
+
+DRAWS = 200_000
+
+
+def words(n: int) -> list[str]:
+    return [f"w{i}" for i in range(n)]
+
+
+def zipf_weights(words: int, skew: float = 1.1) -> list[float]:
+    return [1 / (i + 1) ** skew for i in range(words)]
+
+
+def chi_square_p(counts, weights) -> float:
+    """p-value of observed counts against the weights, words merged into bins of >= 20 expected draws."""
+    total, draws = sum(weights), sum(counts)
+    bins, expected, observed = [], 0.0, 0
+    for w, c in zip(weights, counts):
+        expected += w / total * draws
+        observed += c
+        if expected >= 20:
+            bins.append((expected, observed))
+            expected, observed = 0.0, 0
+    if bins and expected:
+        e, o = bins.pop()
+        bins.append((e + expected, o + observed))
+    chi2 = sum((o - e) ** 2 / e for e, o in bins)
+    df = max(len(bins) - 1, 1)
+    # Coda superiore della chi-quadro, approssimazione normale di Wilson-Hilferty
+    z = ((chi2 / df) ** (1 / 3) - (1 - 2 / (9 * df))) / math.sqrt(2 / (9 * df))
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+@pytest.mark.parametrize("size", [2, 10, 1000])
+def test_draw_index_follows_weights(size):
+    weights = zipf_weights(size)
+    table = pg.WeightedWords(words(size), weights)
+    rng = random.Random(0)
+    counts = [0] * size
+    for _ in range(DRAWS):
+        counts[table.draw_index(rng)] += 1
+    assert chi_square_p(counts, weights) > 0.001
+
+
+def test_check_rejects_draws_that_ignore_the_weights():
+    # Controllo del test stesso: estrazioni uniformi non devono passare contro pesi Zipf
+    weights = zipf_weights(100)
+    rng = random.Random(0)
+    counts = [0] * 100
+    for _ in range(DRAWS):
+        counts[rng.randrange(100)] += 1
+    assert chi_square_p(counts, weights) < 0.001
+
+
+def test_numpy_draws_follow_weights():
+    np = pytest.importorskip("numpy")
+    weights = zipf_weights(1000)
+    parts = {"W": pg.WeightedWords(words(1000), weights)}
+    sampler = pg.BatchSampler(pg.compile_patterns(["{W}"], parts, pg.analyse_parts(parts)))
+    t = next(t for t, alias in enumerate(sampler.alias) if alias is not None)
+    counts = np.bincount(sampler._draw(t, DRAWS, pg.batch_rng(0)), minlength=1000)
+    assert chi_square_p(counts.tolist(), weights) > 0.001
+
+
+def test_weights_survive_merging_themes():
+    a = pg.WeightedWords(["x", "y"], [1, 3])
+    merged = pg.concat_words(a, ["z"])
+    assert list(merged) == ["x", "y", "z"]
+    assert merged.weights == [1.0, 3.0, 1.0]